@@ -0,0 +1,105 @@
+"""Count koji hub round trips made by from-koji.py for a module, against an offline fake hub.
+
+Run with: python3 bench_koji.py [--builds N] [--rpms N]
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from sbomtools.fakekoji import FakeKojiSession  # noqa: E402
+from sbomtools.kojiclient import CachingSession  # noqa: E402
+
+
+def load_from_koji():
+    spec = importlib.util.spec_from_file_location(
+        "from_koji", os.path.join(HERE, "..", "rpm", "build", "from-koji.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def module_fixtures(num_builds, num_rpms):
+    module_nvr = "example-module-8060020250609110611.97d7f71f"
+    builds = {
+        module_nvr: {
+            "id": 1,
+            "nvr": module_nvr,
+            "state": 1,
+            "btypes": {"module": None},
+            "extra": {
+                "typeinfo": {
+                    "module": {
+                        "content_koji_tag": "module-example-8060020250609110611-97d7f71f",
+                        "name": "example",
+                        "stream": "rhel8",
+                        "version": "8060020250609110611",
+                        "context": "97d7f71f",
+                    }
+                }
+            },
+        }
+    }
+    for build_id in range(2, num_builds + 2):
+        nvr = f"pkg{build_id}-1.0-1.module+el8.6.0+1+abcdef12"
+        builds[nvr] = {
+            "id": build_id,
+            "nvr": nvr,
+            "state": 1,
+            "rpms": [
+                {"name": f"pkg{build_id}-sub{i}", "arch": "x86_64", "nvr": nvr}
+                for i in range(num_rpms)
+            ],
+        }
+    tags = {"module-example-8060020250609110611-97d7f71f": list(builds)[1:]}
+    return module_nvr, {"builds": builds, "tags": tags}
+
+
+class UncachedSession:
+    """Plain session without batching or memoization, as a baseline."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def __getattr__(self, method):
+        return getattr(self.session, method)
+
+    def prefetch(self, calls):
+        pass
+
+
+def count_round_trips(from_koji, session, hub, module_nvr):
+    build_ids, _ = from_koji.get_build_ids(session, module_nvr)
+    for build_id in build_ids:
+        # The same metadata queries SBOMBuilder.process_build makes for each build
+        session.prefetch([("getBuild", (build_id,)), ("listBuildRPMs", (build_id,))])
+        session.getBuild(build_id)
+        session.listBuildRPMs(build_id)
+    return hub.round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--builds", type=int, default=50, help="builds tagged into the module")
+    parser.add_argument("--rpms", type=int, default=20, help="RPMs per build")
+    args = parser.parse_args()
+
+    from_koji = load_from_koji()
+    module_nvr, fixtures = module_fixtures(args.builds, args.rpms)
+
+    hub = FakeKojiSession(fixtures)
+    uncached = count_round_trips(from_koji, UncachedSession(hub), hub, module_nvr)
+    hub = FakeKojiSession(fixtures)
+    cached = count_round_trips(from_koji, CachingSession(hub), hub, module_nvr)
+
+    print(f"module with {args.builds} builds of {args.rpms} RPMs each")
+    print(f"  plain session:   {uncached} round trips")
+    print(f"  caching session: {cached} round trips")
+
+
+if __name__ == "__main__":
+    main()
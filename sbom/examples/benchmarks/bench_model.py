@@ -0,0 +1,55 @@
+"""Compare the memory held by example SBOMs as nested dicts and as sbomtools.model documents.
+
+Each openshift-pipelines-client example SBOM is loaded with json.load() and then decoded into a
+Document, measuring with tracemalloc what either form keeps alive. The Document is also checked to
+encode back to the same JSON.
+
+Run with: python3 bench_model.py
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from sbomtools.model import Document  # noqa: E402
+from sbomtools.writer import iterencode  # noqa: E402
+
+EXAMPLE = os.path.join(HERE, "..", "rpm", "build", "openshift-pipelines-client-1.14.3-11352.el8")
+
+
+def retained(load):
+    """Return the result of load() and the number of bytes it keeps allocated."""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("sboms", nargs="*", default=[f"{EXAMPLE}.spdx.json", f"{EXAMPLE}.cdx.json"])
+    args = parser.parse_args()
+
+    for path in args.sboms:
+        with open(path) as fp:
+            text = fp.read()
+        doc, dict_size = retained(lambda: json.loads(text))
+        document, model_size = retained(lambda: Document.decode(json.loads(text)))
+        assert "".join(iterencode(document.encode())) == json.dumps(doc, indent=2)
+        print(
+            f"{os.path.basename(path)}: {len(text) / 2**20:.1f} MiB JSON, "
+            f"dicts {dict_size / 2**20:.1f} MiB, model {model_size / 2**20:.1f} MiB "
+            f"({1 - model_size / dict_size:.0%} less)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare sbomtools.purl against packageurl-python on the purl work done by add_release_data.py.
+
+For every RPM purl in the openshift-pipelines-client example SBOMs, the purl is parsed twice (once
+to collect the architectures, once to rewrite it) and formatted once per repository and
+architecture, like add_release_data.py does.
+
+Run with: python3 bench_purl.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from packageurl import PackageURL
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from sbomtools.purl import parse_purl  # noqa: E402
+
+EXAMPLE = os.path.join(HERE, "..", "rpm", "build", "openshift-pipelines-client-1.14.3-11352.el8")
+REPO_IDS = [
+    "rhel-9-for-{arch}-appstream-rpms",
+    "rhel-9-for-{arch}-baseos-eus-rpms",
+    "rhel-9-for-{arch}-baseos-aus-rpms",
+    "rhel-9-for-{arch}-baseos-e4s-rpms",
+]
+
+
+def load_purls():
+    with open(f"{EXAMPLE}.spdx.json") as fp:
+        spdx = json.load(fp)
+    with open(f"{EXAMPLE}.cdx.json") as fp:
+        cdx = json.load(fp)
+    purls = [
+        ref["referenceLocator"]
+        for package in spdx["packages"]
+        for ref in package.get("externalRefs", [])
+        if ref["referenceType"] == "purl"
+    ]
+    purls.extend(component["purl"] for component in cdx["components"])
+    return [purl for purl in purls if purl.startswith("pkg:rpm/redhat")]
+
+
+def with_packageurl(purls):
+    arches = {PackageURL.from_string(purl).qualifiers["arch"] for purl in purls}
+    results = []
+    for purl in purls:
+        purl_data = PackageURL.from_string(purl)
+        for repo_id in REPO_IDS:
+            for arch in sorted(arches):
+                purl_data.qualifiers["repository_id"] = repo_id.format(arch=arch)
+                results.append(purl_data.to_string())
+    return results
+
+
+def with_sbomtools(purls):
+    arches = {parse_purl(purl).qualifiers["arch"] for purl in purls}
+    results = []
+    for purl in purls:
+        purl_data = parse_purl(purl)
+        for repo_id in REPO_IDS:
+            for arch in sorted(arches):
+                results.append(purl_data.to_string({"repository_id": repo_id.format(arch=arch)}))
+    return results
+
+
+def measure(function, purls, repeat):
+    best = None
+    for _ in range(repeat):
+        parse_purl.cache_clear()
+        start = time.perf_counter()
+        results = function(purls)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best counts")
+    args = parser.parse_args()
+
+    purls = load_purls()
+    baseline, expected = measure(with_packageurl, purls, args.repeat)
+    fast, results = measure(with_sbomtools, purls, args.repeat)
+    assert results == expected, "sbomtools.purl output differs from packageurl-python"
+
+    print(f"{len(purls)} purls, {len(results)} formatted")
+    print(f"  packageurl-python: {baseline * 1000:8.1f} ms")
+    print(f"  sbomtools.purl:    {fast * 1000:8.1f} ms ({baseline / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Time the catalog requests from_catalog.py makes for an image, against a local fake catalog.
+
+The requests are made once like from_catalog.py used to (a new connection per request, RPM
+manifests one arch after the other, no paging) and once with sbomtools.pyxis.PyxisClient. Some
+requests fail at first to show that the client retries them.
+
+Run with: python3 bench_pyxis.py [--arches N] [--delay SECONDS]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from sbomtools.fakepyxis import FakePyxisServer  # noqa: E402
+from sbomtools.pyxis import PyxisClient  # noqa: E402
+
+IMAGE_NVR = "ubi9-micro-container-9.4-6.1716471860"
+
+
+def catalog_fixtures(num_arches, num_rpms):
+    images = [
+        {"_id": f"{index:024x}", "architecture": f"arch{index}"} for index in range(num_arches)
+    ]
+    responses = {f"images/nvr/{IMAGE_NVR}": {"data": images}}
+    for image in images:
+        responses[f"images/id/{image['_id']}/rpm-manifest"] = {
+            "rpms": [
+                {"nvra": f"pkg{index}-1.0-1.el9.{image['architecture']}"}
+                for index in range(num_rpms)
+            ]
+        }
+    return responses
+
+
+def fetch_plain(url):
+    response = requests.get(url + f"images/nvr/{IMAGE_NVR}")
+    response.raise_for_status()
+    manifests = {}
+    for image in response.json()["data"]:
+        response = requests.get(url + f"images/id/{image['_id']}/rpm-manifest")
+        response.raise_for_status()
+        manifests[image["_id"]] = response.json()["rpms"]
+    return manifests
+
+
+def fetch_client(url):
+    client = PyxisClient(url)
+    images = client.get_images(IMAGE_NVR)
+    manifests = client.get_rpms_for_images(image["_id"] for image in images)
+    client.close()
+    return manifests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arches", type=int, default=250, help="images (arches) of the build")
+    parser.add_argument("--rpms", type=int, default=200, help="RPMs per image")
+    parser.add_argument("--delay", type=float, default=0.02, help="latency per request")
+    args = parser.parse_args()
+
+    responses = catalog_fixtures(args.arches, args.rpms)
+    print(f"image with {args.arches} arches of {args.rpms} RPMs, {args.delay}s latency")
+
+    with FakePyxisServer(responses, delay=args.delay) as server:
+        start = time.perf_counter()
+        plain = fetch_plain(server.url)
+        print(
+            f"  plain requests: {time.perf_counter() - start:.2f}s, "
+            f"{server.requests} requests, {server.connections} connections, "
+            f"{len(plain)} of {args.arches} images (not paged)"
+        )
+
+    # The second manifest fails once before it is served
+    failures = {f"images/id/{1:024x}/rpm-manifest": 1}
+    with FakePyxisServer(responses, delay=args.delay, failures=failures) as server:
+        start = time.perf_counter()
+        client = fetch_client(server.url)
+        print(
+            f"  pyxis client:   {time.perf_counter() - start:.2f}s, "
+            f"{server.requests} requests, {server.connections} connections, "
+            f"{len(client)} of {args.arches} images"
+        )
+    assert all(
+        client[image_id] == sorted(plain[image_id], key=lambda r: r["nvra"]) for image_id in plain
+    )
+
+
+if __name__ == "__main__":
+    main()
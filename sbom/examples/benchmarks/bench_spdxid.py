@@ -0,0 +1,101 @@
+"""Compare sbomtools.spdxid against the sanitize_spdxid() the generators used to copy.
+
+SPDX IDs are made for a synthetic document of RPMs ("SPDXRef-<arch>-<name>") at the scale of
+large container images, including names that only differ in characters that are dropped or
+replaced (like foo_bar and foo-bar) and RPMs installed more than once (like gpg-pubkey). The old
+function gives these the same IDs; the allocator gives unique ones. The plain translation
+(sbomtools.spdxid.sanitize_spdxid) is timed too.
+
+Run with: python3 bench_spdxid.py [--packages N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from sbomtools import spdxid  # noqa: E402
+
+ARCHES = ["x86_64", "aarch64", "ppc64le", "s390x", "noarch", "i686"]
+
+
+def sanitize_spdxid(value):
+    # As it was in from-koji.py and from_catalog.py
+    value = value.replace("_", "-")
+    return re.sub(r"[^a-zA-Z0-9.-]", "", value)
+
+
+def make_values(count):
+    rng = random.Random(0)
+    values = []
+    for index in range(count):
+        name = f"python3-pkg{index}"
+        if index % 50 == 0:
+            name = f"lib_{index // 2}+compat"
+        elif index % 50 == 1:
+            name = f"lib-{index // 2}compat"
+        elif index % 500 == 2:
+            name = "gpg-pubkey"
+        values.append(f"SPDXRef-{rng.choice(ARCHES)}-{name}")
+    return values
+
+
+def with_sanitize(values):
+    return [sanitize_spdxid(value) for value in values]
+
+
+def with_translate(values):
+    return [spdxid.sanitize_spdxid(value) for value in values]
+
+
+def with_allocator(values):
+    spdxids = spdxid.SPDXIDAllocator()
+    return [spdxids.allocate(value) for value in values]
+
+
+def measure(function, values, repeat):
+    best = None
+    for _ in range(repeat):
+        # The old function compiled the pattern on the first call too (re caches it)
+        re.purge()
+        start = time.perf_counter()
+        results = function(values)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--packages", type=int, default=100_000, help="number of packages")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best counts")
+    args = parser.parse_args()
+
+    values = make_values(args.packages)
+    baseline, expected = measure(with_sanitize, values, args.repeat)
+    translated, results = measure(with_translate, values, args.repeat)
+    assert results == expected, "sbomtools.spdxid.sanitize_spdxid output differs"
+    fast, results = measure(with_allocator, values, args.repeat)
+    assert len(set(results)) == len(results), "allocated IDs are not unique"
+    assert all(
+        result == old or result.startswith(old + "-") for result, old in zip(results, expected)
+    )
+
+    print(f"{len(values)} packages")
+    print(
+        f"  old sanitize_spdxid:    {baseline * 1000:8.1f} ms, "
+        f"{len(expected) - len(set(expected))} duplicate IDs"
+    )
+    print(f"  spdxid.sanitize_spdxid: {translated * 1000:8.1f} ms ({baseline / translated:.1f}x)")
+    print(
+        f"  SPDXIDAllocator:        {fast * 1000:8.1f} ms ({baseline / fast:.1f}x), "
+        f"{sum(result != old for result, old in zip(results, expected))} IDs with a suffix"
+    )
+
+
+if __name__ == "__main__":
+    main()
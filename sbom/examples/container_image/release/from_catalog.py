@@ -1,14 +1,31 @@
-import json
-import re
-import subprocess
+import argparse
+import os
 import sys
-import tempfile
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import koji
-import requests
 import yaml
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sbomtools.bulk import Journal, StageTimer, read_items, run_bulk  # noqa: E402
+from sbomtools.fragments import FragmentStore, arch_variables  # noqa: E402
+from sbomtools.gitmirror import GitMirror  # noqa: E402
+from sbomtools.graph import RelationshipGraph  # noqa: E402
+from sbomtools.kojiclient import CachingSession  # noqa: E402
+from sbomtools.pyxis import PyxisClient  # noqa: E402
+from sbomtools.recording import (  # noqa: E402
+    FixtureStore,
+    RecordingGitMirror,
+    RecordingKojiSession,
+    RecordingPyxisClient,
+    ReplayGitMirror,
+    ReplayKojiSession,
+    ReplayPyxisClient,
+)
+from sbomtools.spdxid import SPDXIDAllocator  # noqa: E402
+from sbomtools.writer import write_json  # noqa: E402
+
 # These container images (identified by their NVR) are known to contain only RPM packages and no
 # other content type.
 RPM_CONTAINER_IMAGES = {
@@ -16,38 +33,6 @@ RPM_CONTAINER_IMAGES = {
     "kernel-module-management-operator-container-1.1.2-25": "https://git.example.com/containers/kernel-module-management-operator#799f12ccdec1ead269f54c4e3e51c28d7c794ae4",  # Contains openssl-3.0.7-18.el9_2
 }
 
-catalog_url = "https://catalog.redhat.com/api/containers/v1/"
-nvr_api = catalog_url + "images/nvr/"
-rpm_manifest_api = catalog_url + "images/id/{catalog_image_id}/rpm-manifest"
-
-profile = koji.get_profile_module("brew")
-koji_session = koji.ClientSession(profile.config.server)
-
-
-def sanitize_spdxid(value):
-    """ "Emit a valid SPDXRef-"[idstring]"
-
-    where [idstring] is a unique string containing letters, numbers, ., and/or -.
-    """
-    value = value.replace("_", "-")  # Replace underscores with dashes to retain readability
-    # Remove everything else (yes, there is a minor chance for conflicting IDs, but this is an
-    # example script with minimal examples; do not use this in production).
-    return re.sub(r"[^a-zA-Z0-9.-]", "", value)
-
-
-def get_image_data(image_nvr):
-    response = requests.get(nvr_api + image_nvr)
-    response.raise_for_status()
-    # This is a paged response, but we're assuming there are not 100+ images for a single
-    # container image NVR.
-    return sorted(response.json()["data"], key=lambda image: image["_id"])
-
-
-def get_rpms(image_id):
-    response = requests.get(rpm_manifest_api.format(catalog_image_id=image_id))
-    response.raise_for_status()
-    return sorted(response.json()["rpms"], key=lambda rpm: rpm["nvra"])
-
 
 def append_cpe_external_refs(pkg, cpe_ids):
     for cpe in cpe_ids or []:
@@ -57,7 +42,15 @@ def append_cpe_external_refs(pkg, cpe_ids):
 
 
 def create_sbom(
-    image_id, root_package, packages, rel_type, other_pkgs=None, other_rels=None, source_pkgs=None
+    image_id,
+    root_package,
+    packages,
+    rel_type,
+    other_pkgs=None,
+    other_rels=None,
+    source_pkgs=None,
+    fragments=None,
+    variables=(),
 ):
     relationships = list(other_rels or [])
     relationships.insert(
@@ -106,6 +99,11 @@ def create_sbom(
                     }
                 )
 
+    all_packages = [root_package] + packages + (other_pkgs or [])
+    dangling = RelationshipGraph(relationships, all_packages).dangling()
+    if dangling:
+        raise ValueError(f"relationships to unknown SPDX elements in {image_id}: {dangling}")
+
     spdx = {
         "spdxVersion": "SPDX-2.3",
         "dataLicense": "CC0-1.0",
@@ -116,14 +114,14 @@ def create_sbom(
         },
         "name": image_id,
         "documentNamespace": f"https://www.redhat.com/{image_id}.spdx.json",
-        "packages": [root_package] + packages + (other_pkgs or []),
+        "packages": all_packages,
         "relationships": relationships,
     }
 
-    with open(f"{image_id}.spdx.json", "w") as fp:
-        # Add an extra newline at the end since a lot of editors add one when you save a file,
-        # and these files get opened and read in editors a lot.
-        fp.write(json.dumps(spdx, indent=2) + "\n")
+    if fragments:
+        fragments.write(f"{image_id}.spdx.json", spdx, variables)
+    else:
+        write_json(f"{image_id}.spdx.json", spdx)
 
 
 def get_package_name_from_uri(uri: str) -> str:
@@ -131,326 +129,388 @@ def get_package_name_from_uri(uri: str) -> str:
     return parse_image_repo.path.split("/")[1]
 
 
-def generate_sboms_for_image(image_nvr):
-    # Split to e.g. "ubi9-micro-container" and "9.4-6.1716471860"
-    image_nvr_name, *image_nvr_version = image_nvr.rsplit("-", maxsplit=2)
-    image_nvr_version = "-".join(image_nvr_version)
+def prefetch_parent_archives(koji_session, build):
+    """Fetch the archives of all parent image builds of build in one multicall.
 
-    image_index_pkg = None
-    source_pkgs = []
-    per_arch_images = []
-
-    for image in get_image_data(image_nvr):
-        packages = []
-        other_pkgs = []
-        other_rels = []
-
-        catalog_image_id = image["_id"]
-        image_digest = image["image_id"]
-        content_sets = image["content_sets"]
-
-        # A container image may be available through more than one repo; collect all repos,
-        # registries they are available from, and the most specific tag for each repo image.
-        repos = set()
-        image_index_digest = ""
-        for repo in image["repositories"]:
-            repo_url = f"{repo['registry']}/{repo['repository']}"
-            tags = list(
-                sorted(
-                    [t for t in repo["tags"] if t["name"] != "latest"],
-                    # Sort by the length of the tag, ignoring "latest"; this is a very dumb
-                    # heuristic to find the most specific tag for a particular image. From tags
-                    # such as "9.4", "latest", and "9.4-6.1716471860", it will select the last one.
-                    key=lambda x: len(x["name"]),
-                    reverse=True,
-                )
+    The parent builds themselves are fetched too, so that their archives can be cached on disk.
+    """
+    image_data = build
+    for key in ("extra", "typeinfo", "image"):
+        image_data = image_data.get(key, {})
+    parent_build_ids = [
+        parent_build["id"] for parent_build in image_data.get("parent_image_builds", {}).values()
+    ]
+    koji_session.prefetch(
+        [("getBuild", (build_id,)) for build_id in parent_build_ids]
+        + [("listArchives", (build_id,)) for build_id in parent_build_ids]
+    )
+
+
+def get_image_repos(image):
+    """Return the sorted (name, URL, tag) of the repos an image is in, and its index digest.
+
+    A container image may be available through more than one repo; collect all repos, registries
+    they are available from, and the most specific tag for each repo image.
+    """
+    catalog_image_id = image["_id"]
+    repos = set()
+    image_index_digest = ""
+    for repo in image["repositories"]:
+        repo_url = f"{repo['registry']}/{repo['repository']}"
+        tags = list(
+            sorted(
+                [t for t in repo["tags"] if t["name"] != "latest"],
+                # Sort by the length of the tag, ignoring "latest"; this is a very dumb
+                # heuristic to find the most specific tag for a particular image. From tags
+                # such as "9.4", "latest", and "9.4-6.1716471860", it will select the last one.
+                key=lambda x: len(x["name"]),
+                reverse=True,
             )
-            if not tags:
-                print(f"ERROR: no usable tag found for image ID: {catalog_image_id}")
-                sys.exit(1)
-            repo_name = repo["repository"].split("/")[-1]
-            repos.add((repo_name, repo_url, tags[0]["name"]))
-            image_index_digest = repo["manifest_list_digest"].lstrip("sha256:")
-
-        if not repos or not image_index_digest:
-            print("ERROR: No repos or image index digest found for image ID: {catalog_image_id}")
+        )
+        if not tags:
+            print(f"ERROR: no usable tag found for image ID: {catalog_image_id}")
             sys.exit(1)
+        repo_name = repo["repository"].split("/")[-1]
+        repos.add((repo_name, repo_url, tags[0]["name"]))
+        image_index_digest = repo["manifest_list_digest"].lstrip("sha256:")
 
-        # Get license information from labels if it is set
-        image_license = "NOASSERTION"
-        spdx_license_ids = {
-            "Apache License 2.0": "Apache-2.0",
-        }
-        for label in image["parsed_data"]["labels"]:
-            if label["name"].lower() == "license":
-                image_license = label["value"]
-                image_license = spdx_license_ids.get(image_license, image_license)
-
-        # Create an index image object, but since all arch-specific images are descendents of one
-        # and the same index image, we only have to create it once. Its SBOM is created at the
-        # end after we collect information about all arch-specific images.
-        if not image_index_pkg:
-            image_index_pkg = {
-                "SPDXID": "SPDXRef-image-index",
-                "name": image_nvr_name,
-                "versionInfo": image_nvr_version,
-                "supplier": "Organization: Red Hat",
-                "downloadLocation": "NOASSERTION",
-                "licenseDeclared": image_license,
-                "externalRefs": [],
-                "checksums": [
-                    {
-                        "algorithm": "SHA256",
-                        "checksumValue": image_index_digest,
-                    }
-                ],
+    if not repos or not image_index_digest:
+        print("ERROR: No repos or image index digest found for image ID: {catalog_image_id}")
+        sys.exit(1)
+    return sorted(repos), image_index_digest
+
+
+def get_image_license(image):
+    """Get license information from labels if it is set."""
+    image_license = "NOASSERTION"
+    spdx_license_ids = {
+        "Apache License 2.0": "Apache-2.0",
+    }
+    for label in image["parsed_data"]["labels"]:
+        if label["name"].lower() == "license":
+            image_license = label["value"]
+            image_license = spdx_license_ids.get(image_license, image_license)
+    return image_license
+
+
+def create_image_index_package(image, image_nvr_name, image_nvr_version):
+    """Create the index image package from (the first) one of its arch-specific images."""
+    repos, image_index_digest = get_image_repos(image)
+    image_index_pkg = {
+        "SPDXID": "SPDXRef-image-index",
+        "name": image_nvr_name,
+        "versionInfo": image_nvr_version,
+        "supplier": "Organization: Red Hat",
+        "downloadLocation": "NOASSERTION",
+        "licenseDeclared": get_image_license(image),
+        "externalRefs": [],
+        "checksums": [
+            {
+                "algorithm": "SHA256",
+                "checksumValue": image_index_digest,
             }
-            for name, repo_url, tag in sorted(repos):
-                purl = (
-                    f"pkg:oci/{name}@sha256:{image_index_digest}?"
-                    f"repository_url={repo_url}&tag={tag}"
-                )
-                ref = {
-                    "referenceCategory": "PACKAGE-MANAGER",
-                    "referenceType": "purl",
-                    "referenceLocator": purl,
-                }
-                image_index_pkg["externalRefs"].append(ref)
-            append_cpe_external_refs(image_index_pkg, image.get("cpe_ids"))
-
-        arch = image["architecture"]
-        spdx_image_id = sanitize_spdxid(f"SPDXRef-{image_nvr_name}-{arch}")
-        image_pkg = {
-            "SPDXID": spdx_image_id,
-            "name": f"{image_nvr_name}_{arch}",
-            "versionInfo": image_nvr_version,
+        ],
+    }
+    for name, repo_url, tag in repos:
+        purl = f"pkg:oci/{name}@sha256:{image_index_digest}?repository_url={repo_url}&tag={tag}"
+        ref = {
+            "referenceCategory": "PACKAGE-MANAGER",
+            "referenceType": "purl",
+            "referenceLocator": purl,
+        }
+        image_index_pkg["externalRefs"].append(ref)
+    append_cpe_external_refs(image_index_pkg, image.get("cpe_ids"))
+    return image_index_pkg
+
+
+def create_source_packages(git_mirror, build, image_nvr, origin_name):
+    """Create the packages of the source repositories of an image build.
+
+    origin_name is the name given to the package of the remote source, if there is one.
+    """
+    source_pkgs = []
+    # There is where the actual image source can be read from. Because this is private data, I'm hardcoding some values here
+    image_source = build["source"]
+    image_repo, repo_commit = split_source_repo_parts(image_source)
+
+    # Other images (e.g. in bulk runs) use their real source
+    mock_source = RPM_CONTAINER_IMAGES.get(image_nvr, image_source)
+    mock_repo, mock_commit = split_source_repo_parts(mock_source)
+    package_name = get_package_name_from_uri(mock_repo)
+    source_pkgs.append(
+        {
+            "SPDXID": f"{image_nvr}-Source",
+            "name": package_name,
+            "versionInfo": f"{mock_commit}",
             "supplier": "Organization: Red Hat",
-            "downloadLocation": "NOASSERTION",
-            "licenseDeclared": image_license,
-            "externalRefs": [],
-            "checksums": [
+            "downloadLocation": mock_source,
+            "licenseDeclared": "NOASSERTION",
+            "externalRefs": [
                 {
-                    "algorithm": "SHA256",
-                    "checksumValue": image_digest.lstrip("sha256:"),
-                }
+                    "referenceCategory": "PACKAGE-MANAGER",
+                    "referenceType": "purl",
+                    "referenceLocator": f"pkg:generic/{package_name}@{repo_commit}?download_url={mock_source}",
+                },
             ],
         }
-        for name, repo_url, tag in sorted(repos):
-            purl = (
-                f"pkg:oci/{name}@sha256:{image_digest}?"
-                f"arch={arch}&repository_url={repo_url}&tag={tag}"
-            )
-            ref = {
-                "referenceCategory": "PACKAGE-MANAGER",
-                "referenceType": "purl",
-                "referenceLocator": purl,
-            }
-            image_pkg["externalRefs"].append(ref)
-        append_cpe_external_refs(image_pkg, image.get("cpe_ids"))
-        per_arch_images.append(image_pkg)
-
-        image_data = koji_session.getBuild(image_nvr)
-
-        # Add in source repositories. but since all arch-specific images are descendents of one
-        # and the same source repository, we only have to create it once. It's added only to the image
-        # index SBOM at the end.
-        if not source_pkgs:
-            # There is where the actual image source can be read from. Because this is private data, I'm hardcoding some values here
-            image_source = image_data["source"]
-            image_repo, repo_commit = split_source_repo_parts(image_source)
-
-            mock_source = RPM_CONTAINER_IMAGES[image_nvr]
-            mock_repo, mock_commit = split_source_repo_parts(mock_source)
-            package_name = get_package_name_from_uri(mock_repo)
-            source_pkgs.append(
-                {
-                    "SPDXID": f"{image_nvr}-Source",
-                    "name": package_name,
-                    "versionInfo": f"{mock_commit}",
-                    "supplier": "Organization: Red Hat",
-                    "downloadLocation": mock_source,
-                    "licenseDeclared": "NOASSERTION",
-                    "externalRefs": [
-                        {
-                            "referenceCategory": "PACKAGE-MANAGER",
-                            "referenceType": "purl",
-                            "referenceLocator": f"pkg:generic/{package_name}@{repo_commit}?download_url={mock_source}",
-                        },
-                    ],
-                }
-            )
-
-            remote_repo = ""
-            remote_ref = ""
-
-            # Clone the repository to a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                subprocess.run(["git", "clone", image_repo, temp_dir])
-
-                # Change to the specific commit
-                subprocess.run(["git", "checkout", repo_commit], cwd=temp_dir)
-
-                # Remote Sources could be a list, for example
-                # https://pkgs.devel.redhat.com/cgit/containers/quay/tree/container.yaml?h=quay-3.13-rhel-8
-                # Read the YAML file
-                with open(f"{temp_dir}/container.yaml", "r") as file:
-                    container_data = yaml.safe_load(file)
-                    remote_source = container_data.get("remote_source", {})
-                    remote_repo = remote_source.get("repo", "")
-                    remote_ref = remote_source.get("ref", "")
-
-            if remote_repo:
-                package_name = get_package_name_from_uri(remote_repo)
-                remote_source = f"{remote_repo}#{remote_ref}"
-                source_pkgs.append(
-                    {
-                        "SPDXID": f"{image_nvr}-Source-origin",
-                        "name": name,
-                        "versionInfo": remote_ref,
-                        "supplier": "Organization: Red Hat",
-                        "downloadLocation": remote_source,
-                        "licenseDeclared": "NOASSERTION",
-                        "externalRefs": [
-                            {
-                                "referenceCategory": "PACKAGE-MANAGER",
-                                "referenceType": "purl",
-                                "referenceLocator": f"pkg:generic/{package_name}@{remote_ref}?download_url={image_source}",
-                            },
-                        ],
-                    }
-                )
+    )
 
-        # Add in parent images
-        for key in ("extra", "typeinfo", "image"):
-            image_data = image_data.get(key, {})
-
-        parent_image_builds = image_data.get("parent_image_builds", {})
-        parent_images = image_data.get("parent_images", [])
-        direct_parent_index = len(parent_images) - 1
-        for index, parent_image in enumerate(parent_images):
-            try:
-                parent_image_build_id = parent_image_builds[parent_image]["id"]
-            except KeyError:
-                # Skip scratch builds
-                continue
-
-            parent_archives = koji_session.listArchives(parent_image_build_id)
-            parent_digests = [
-                list(a["extra"]["docker"]["digests"].values())[0]
-                for a in parent_archives
-                if a["btype"] == "image" and a["extra"]["docker"]["config"]["architecture"] == arch
-            ]
-            parent_digest = parent_digests[0] if parent_digests else ""
-            if parent_digests:
-                version = f"@{parent_digest}"
-            else:
-                version = ""
-
-            registry, rest = parent_image.split("/", maxsplit=1)
-            use_registry = registry in ("registry.redhat.io", "registry.access.redhat.com")
-            name, tag = rest.rsplit(":", maxsplit=1)
-            if "/" in name:
-                namespace, name = name.rsplit("/", maxsplit=1)
-                registry += "/" + namespace
-
-            registry_q = f"&repository_url={registry}" if use_registry else ""
-            parent_spdx_id = sanitize_spdxid(f"SPDXRef-parent-image-{index}-{arch}")
-            purl = f"pkg:oci/{name}{version}?tag={tag}{registry_q}"
-
-            parent_pkg = {
-                "SPDXID": parent_spdx_id,
-                "name": f"{name}_{arch}",
-                "versionInfo": f"{tag}",
+    # Remote Sources could be a list, for example
+    # https://pkgs.devel.redhat.com/cgit/containers/quay/tree/container.yaml?h=quay-3.13-rhel-8
+    # Read the YAML file straight from the mirrored repository
+    container_yaml = git_mirror.read_file(image_repo, repo_commit, "container.yaml")
+    if container_yaml is None:
+        raise FileNotFoundError(f"No container.yaml in {image_repo} at {repo_commit}")
+    container_data = yaml.safe_load(container_yaml)
+    remote_source = container_data.get("remote_source", {})
+    remote_repo = remote_source.get("repo", "")
+    remote_ref = remote_source.get("ref", "")
+
+    if remote_repo:
+        package_name = get_package_name_from_uri(remote_repo)
+        remote_source = f"{remote_repo}#{remote_ref}"
+        source_pkgs.append(
+            {
+                "SPDXID": f"{image_nvr}-Source-origin",
+                "name": origin_name,
+                "versionInfo": remote_ref,
                 "supplier": "Organization: Red Hat",
-                "downloadLocation": "NOASSERTION",
+                "downloadLocation": remote_source,
                 "licenseDeclared": "NOASSERTION",
                 "externalRefs": [
                     {
                         "referenceCategory": "PACKAGE-MANAGER",
                         "referenceType": "purl",
-                        "referenceLocator": purl,
+                        "referenceLocator": f"pkg:generic/{package_name}@{remote_ref}?download_url={image_source}",
                     },
                 ],
             }
-            if parent_digest:
-                parent_pkg["checksums"] = [
-                    {
-                        "algorithm": "SHA256",
-                        "checksumValue": parent_digest.lstrip("sha256:"),
-                    }
-                ]
-            other_pkgs.append(parent_pkg)
+        )
+    return source_pkgs
 
-            if index == direct_parent_index:
-                other_rels.append(
-                    {
-                        "spdxElementId": spdx_image_id,
-                        "relationshipType": "DESCENDANT_OF",
-                        "relatedSpdxElement": parent_spdx_id,
-                    }
-                )
-            else:
-                other_rels.append(
-                    {
-                        "spdxElementId": parent_spdx_id,
-                        "relationshipType": "BUILD_TOOL_OF",
-                        "relatedSpdxElement": spdx_image_id,
-                    }
-                )
 
-        for rpm in get_rpms(catalog_image_id):
-            rpm_purl = (
-                f"pkg:rpm/redhat/{rpm['name']}@{rpm['version']}-{rpm['release']}?"
-                # We don't have a way to find out which content set (RPM repo) an RPM came from,
-                # so we arbitrarily choose one here (assuming we have this mapping via RPM
-                # lockfiles or other means eventually).
-                f"arch={rpm['architecture']}&repository_id={content_sets[0]}"
-            )
-            spdx_rpm_id = sanitize_spdxid(f"SPDXRef-{rpm['architecture']}-{rpm['name']}")
-            rpm_pkg = {
-                "SPDXID": spdx_rpm_id,
-                "name": rpm["name"],
-                "versionInfo": rpm["version"],
-                "supplier": "Organization: Red Hat",
-                "downloadLocation": "NOASSERTION",  # Unset on purpose; refer to RPM SBOM
-                "packageFileName": rpm["nvra"] + ".rpm",
-                "licenseDeclared": "NOASSERTION",  # Unset on purpose; refer to RPM SBOM
-                "externalRefs": [
-                    {
-                        "referenceCategory": "PACKAGE-MANAGER",
-                        "referenceType": "purl",
-                        "referenceLocator": rpm_purl,
-                    },
-                ],
-                # We don't have checksums available from Pyxis, but they should be available
-                # during the build process. For example purposes, we'll use a mock value.
-                "checksums": [
-                    {
-                        "algorithm": "SHA256",
-                        "checksumValue": "abcd1234" * 8,
-                    }
-                ],
+def generate_arch_sbom(koji_session, build, image, rpms, image_nvr, fragments=None):
+    """Create the SBOM of one arch-specific image and return the package for the image."""
+    image_nvr_name, *image_nvr_version = image_nvr.rsplit("-", maxsplit=2)
+    image_nvr_version = "-".join(image_nvr_version)
+
+    packages = []
+    other_pkgs = []
+    other_rels = []
+
+    image_digest = image["image_id"]
+    content_sets = image["content_sets"]
+    repos, _ = get_image_repos(image)
+
+    arch = image["architecture"]
+    # RPMs such as gpg-pubkey can be installed more than once; their IDs get a suffix
+    spdxids = SPDXIDAllocator()
+    spdx_image_id = spdxids.allocate(f"SPDXRef-{image_nvr_name}-{arch}")
+    image_pkg = {
+        "SPDXID": spdx_image_id,
+        "name": f"{image_nvr_name}_{arch}",
+        "versionInfo": image_nvr_version,
+        "supplier": "Organization: Red Hat",
+        "downloadLocation": "NOASSERTION",
+        "licenseDeclared": get_image_license(image),
+        "externalRefs": [],
+        "checksums": [
+            {
+                "algorithm": "SHA256",
+                "checksumValue": image_digest.lstrip("sha256:"),
             }
-            packages.append(rpm_pkg)
+        ],
+    }
+    for name, repo_url, tag in repos:
+        purl = (
+            f"pkg:oci/{name}@sha256:{image_digest}?"
+            f"arch={arch}&repository_url={repo_url}&tag={tag}"
+        )
+        ref = {
+            "referenceCategory": "PACKAGE-MANAGER",
+            "referenceType": "purl",
+            "referenceLocator": purl,
+        }
+        image_pkg["externalRefs"].append(ref)
+    append_cpe_external_refs(image_pkg, image.get("cpe_ids"))
+
+    # Add in parent images
+    image_data = build
+    for key in ("extra", "typeinfo", "image"):
+        image_data = image_data.get(key, {})
+
+    parent_image_builds = image_data.get("parent_image_builds", {})
+    parent_images = image_data.get("parent_images", [])
+    direct_parent_index = len(parent_images) - 1
+    for index, parent_image in enumerate(parent_images):
+        try:
+            parent_image_build_id = parent_image_builds[parent_image]["id"]
+        except KeyError:
+            # Skip scratch builds
+            continue
+
+        parent_archives = koji_session.listArchives(parent_image_build_id)
+        parent_digests = [
+            list(a["extra"]["docker"]["digests"].values())[0]
+            for a in parent_archives
+            if a["btype"] == "image" and a["extra"]["docker"]["config"]["architecture"] == arch
+        ]
+        parent_digest = parent_digests[0] if parent_digests else ""
+        if parent_digests:
+            version = f"@{parent_digest}"
+        else:
+            version = ""
+
+        registry, rest = parent_image.split("/", maxsplit=1)
+        use_registry = registry in ("registry.redhat.io", "registry.access.redhat.com")
+        name, tag = rest.rsplit(":", maxsplit=1)
+        if "/" in name:
+            namespace, name = name.rsplit("/", maxsplit=1)
+            registry += "/" + namespace
+
+        registry_q = f"&repository_url={registry}" if use_registry else ""
+        parent_spdx_id = spdxids.allocate(f"SPDXRef-parent-image-{index}-{arch}")
+        purl = f"pkg:oci/{name}{version}?tag={tag}{registry_q}"
+
+        parent_pkg = {
+            "SPDXID": parent_spdx_id,
+            "name": f"{name}_{arch}",
+            "versionInfo": f"{tag}",
+            "supplier": "Organization: Red Hat",
+            "downloadLocation": "NOASSERTION",
+            "licenseDeclared": "NOASSERTION",
+            "externalRefs": [
+                {
+                    "referenceCategory": "PACKAGE-MANAGER",
+                    "referenceType": "purl",
+                    "referenceLocator": purl,
+                },
+            ],
+        }
+        if parent_digest:
+            parent_pkg["checksums"] = [
+                {
+                    "algorithm": "SHA256",
+                    "checksumValue": parent_digest.lstrip("sha256:"),
+                }
+            ]
+        other_pkgs.append(parent_pkg)
 
-        create_sbom(
-            image_id=f"{image_nvr}_" f"{arch}",
-            root_package=image_pkg,
-            packages=packages,
-            rel_type="CONTAINS",
-            other_pkgs=other_pkgs,
-            other_rels=other_rels,
+        if index == direct_parent_index:
+            other_rels.append(
+                {
+                    "spdxElementId": spdx_image_id,
+                    "relationshipType": "DESCENDANT_OF",
+                    "relatedSpdxElement": parent_spdx_id,
+                }
+            )
+        else:
+            other_rels.append(
+                {
+                    "spdxElementId": parent_spdx_id,
+                    "relationshipType": "BUILD_TOOL_OF",
+                    "relatedSpdxElement": spdx_image_id,
+                }
+            )
+
+    for rpm in rpms:
+        rpm_purl = (
+            f"pkg:rpm/redhat/{rpm['name']}@{rpm['version']}-{rpm['release']}?"
+            # We don't have a way to find out which content set (RPM repo) an RPM came from,
+            # so we arbitrarily choose one here (assuming we have this mapping via RPM
+            # lockfiles or other means eventually).
+            f"arch={rpm['architecture']}&repository_id={content_sets[0]}"
         )
+        spdx_rpm_id = spdxids.allocate(f"SPDXRef-{rpm['architecture']}-{rpm['name']}")
+        rpm_pkg = {
+            "SPDXID": spdx_rpm_id,
+            "name": rpm["name"],
+            "versionInfo": rpm["version"],
+            "supplier": "Organization: Red Hat",
+            "downloadLocation": "NOASSERTION",  # Unset on purpose; refer to RPM SBOM
+            "packageFileName": rpm["nvra"] + ".rpm",
+            "licenseDeclared": "NOASSERTION",  # Unset on purpose; refer to RPM SBOM
+            "externalRefs": [
+                {
+                    "referenceCategory": "PACKAGE-MANAGER",
+                    "referenceType": "purl",
+                    "referenceLocator": rpm_purl,
+                },
+            ],
+            # We don't have checksums available from Pyxis, but they should be available
+            # during the build process. For example purposes, we'll use a mock value.
+            "checksums": [
+                {
+                    "algorithm": "SHA256",
+                    "checksumValue": "abcd1234" * 8,
+                }
+            ],
+        }
+        packages.append(rpm_pkg)
 
     create_sbom(
-        image_id=image_nvr,
-        root_package=image_index_pkg,
-        packages=per_arch_images,
-        rel_type="VARIANT_OF",
-        other_pkgs=None,
-        other_rels=None,
-        source_pkgs=source_pkgs,
+        image_id=f"{image_nvr}_" f"{arch}",
+        root_package=image_pkg,
+        packages=packages,
+        rel_type="CONTAINS",
+        other_pkgs=other_pkgs,
+        other_rels=other_rels,
+        fragments=fragments,
+        variables=arch_variables(arch),
     )
+    return image_pkg
+
+
+def generate_sboms_for_image(
+    koji_session, pyxis, git_mirror, image_nvr, jobs=1, timer=None, fragments=None
+):
+    """Create the SBOMs of all arch-specific images of image_nvr and of its image index.
+
+    With jobs > 1, the arch-specific SBOMs are created concurrently; the result is the same.
+    The time spent in each stage is added to timer (a sbomtools.bulk.StageTimer) if given.
+    With fragments (a sbomtools.fragments.FragmentStore), manifests are written instead of SBOMs.
+    """
+    timer = timer or StageTimer()
+    # Split to e.g. "ubi9-micro-container" and "9.4-6.1716471860"
+    image_nvr_name, *image_nvr_version = image_nvr.rsplit("-", maxsplit=2)
+    image_nvr_version = "-".join(image_nvr_version)
+
+    with timer.stage("catalog"):
+        images = pyxis.get_images(image_nvr)
+        # The RPM manifests of all arches are fetched at once
+        rpm_manifests = pyxis.get_rpms_for_images(image["_id"] for image in images)
+    with timer.stage("koji"):
+        # The build and its parents' archives are the same for all arches
+        build = koji_session.getBuild(image_nvr)
+        prefetch_parent_archives(koji_session, build)
+
+    # Since all arch-specific images are descendents of one and the same index image, and of the
+    # same source repository, these are created once from the first image. They're only added to
+    # the image index SBOM at the end.
+    image_index_pkg = create_image_index_package(images[0], image_nvr_name, image_nvr_version)
+    repos, _ = get_image_repos(images[0])
+    with timer.stage("source"):
+        source_pkgs = create_source_packages(git_mirror, build, image_nvr, repos[-1][0])
+
+    def generate(image):
+        return generate_arch_sbom(
+            koji_session, build, image, rpm_manifests[image["_id"]], image_nvr, fragments
+        )
+
+    # map() keeps the order of the images, so the index SBOM doesn't depend on timing
+    with timer.stage("sboms"), ThreadPoolExecutor(max_workers=jobs) as pool:
+        per_arch_images = list(pool.map(generate, images))
+
+        create_sbom(
+            image_id=image_nvr,
+            root_package=image_index_pkg,
+            packages=per_arch_images,
+            rel_type="VARIANT_OF",
+            other_pkgs=None,
+            other_rels=None,
+            source_pkgs=source_pkgs,
+            fragments=fragments,
+        )
 
 
 def split_source_repo_parts(image_source):
@@ -461,5 +521,111 @@ def split_source_repo_parts(image_source):
     return image_repo, repo_commit
 
 
-for rpm_image in RPM_CONTAINER_IMAGES.keys():
-    generate_sboms_for_image(rpm_image)
+def main():
+    parser = argparse.ArgumentParser(description="Create example container image SBOMs")
+    parser.add_argument(
+        "images",
+        nargs="*",
+        default=list(RPM_CONTAINER_IMAGES),
+        help="image NVRs (default: the examples in RPM_CONTAINER_IMAGES)",
+    )
+    parser.add_argument(
+        "--nvr-file",
+        metavar="FILE",
+        help="read image NVRs from FILE (one per line, - for stdin) instead",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of images processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="record finished images in FILE and skip those already recorded, to resume runs",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="number of arch-specific images processed concurrently (default: number of CPUs)",
+    )
+    parser.add_argument("--profile", default="brew", help="Koji profile to use (default: brew)")
+    parser.add_argument(
+        "--koji-cache",
+        metavar="DIR",
+        help="keep build and archive metadata in DIR across runs",
+    )
+    parser.add_argument(
+        "--git-mirrors",
+        metavar="DIR",
+        help="keep bare mirrors of image source repositories in DIR across runs",
+    )
+    parser.add_argument(
+        "--fragments",
+        metavar="FILE",
+        help="store the packages of all SBOMs once in the database FILE and write manifests "
+        "referring to them (see fragment_store.py) instead of SBOMs",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        metavar="DIR",
+        help="save all koji, catalog and git responses to DIR for --replay",
+    )
+    recording.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="answer koji, catalog and git requests from responses saved with --record, offline",
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        store = FixtureStore(args.replay)
+        hub = ReplayKojiSession(store)
+        pyxis = ReplayPyxisClient(store)
+        git_mirror = ReplayGitMirror(store)
+    else:
+        profile = koji.get_profile_module(args.profile)
+        hub = koji.ClientSession(profile.config.server)
+        if args.record:
+            store = FixtureStore(args.record)
+            hub = RecordingKojiSession(hub, store)
+            pyxis = RecordingPyxisClient(store)
+            git_mirror = RecordingGitMirror(store, args.git_mirrors)
+        else:
+            pyxis = PyxisClient()
+            git_mirror = GitMirror(args.git_mirrors)
+    # Parent images such as ubi9 are shared by many images; their builds and archives are only
+    # fetched once per run (or ever, with --koji-cache). Cached calls wouldn't be recorded.
+    koji_session = CachingSession(hub, None if args.record else args.koji_cache)
+    images = read_items(args.nvr_file) if args.nvr_file else args.images
+    journal = Journal(args.journal) if args.journal else None
+    timer = StageTimer()
+    fragments = FragmentStore(args.fragments) if args.fragments else None
+    try:
+        failed = run_bulk(
+            images,
+            lambda image_nvr: generate_sboms_for_image(
+                koji_session, pyxis, git_mirror, image_nvr, args.jobs, timer, fragments
+            ),
+            workers=args.workers,
+            journal=journal,
+        )
+    finally:
+        git_mirror.close()
+        if fragments:
+            fragments.close()
+        if journal:
+            journal.close()
+    for line in timer.report():
+        print(line, file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
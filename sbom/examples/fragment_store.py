@@ -0,0 +1,70 @@
+"""Store SBOMs as manifests whose packages are kept once in a shared fragment store.
+
+The packages of all SBOMs packed into the same store are written once, even when they differ
+only in the arch between the arch-specific SBOMs of an image (see sbomtools/fragments.py).
+Unpacking a manifest gives back exactly the file it was packed from. For example:
+
+    python3 fragment_store.py pack -s /tmp/fragments.db -o /tmp/manifests container_image/*/*.json
+    python3 fragment_store.py unpack -s /tmp/fragments.db -o /tmp/sboms /tmp/manifests/*.json
+
+The arch of an SBOM is taken from its name (e.g. <image>_arm64.spdx.json).
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sbomtools.fragments import MANIFEST_SUFFIX, FragmentStore, arch_variables  # noqa: E402
+from sbomtools.release import get_sbom_format  # noqa: E402
+
+ARCH_SUFFIX = re.compile(r"_([a-z0-9]+)\.(spdx|cdx)\.json$")
+
+
+def pack(store, sbom_file, output_dir):
+    with open(sbom_file) as fp:
+        doc = json.load(fp)
+    match = ARCH_SUFFIX.search(os.path.basename(sbom_file))
+    variables = arch_variables(match[1]) if match else ()
+    store.write(os.path.join(output_dir, os.path.basename(sbom_file)), doc, variables)
+
+
+def unpack(store, manifest_file, output_dir):
+    name = os.path.basename(manifest_file).removesuffix(MANIFEST_SUFFIX)
+    store.write_unpacked(manifest_file, os.path.join(output_dir, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("action", choices=["pack", "unpack"])
+    parser.add_argument("files", nargs="+", help="SBOM files to pack or manifests to unpack")
+    parser.add_argument(
+        "-s", "--store", required=True, help="SQLite database of the fragment store"
+    )
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write the results to")
+    parser.epilog = __doc__.split("\n\n", 1)[1]
+    args = parser.parse_args()
+
+    store = FragmentStore(args.store)
+    try:
+        for path in args.files:
+            if args.action == "pack":
+                if get_sbom_format(path) is None:
+                    sys.exit(f"ERROR: {path} is neither .spdx.json nor .cdx.json")
+                pack(store, path, args.output_dir)
+            else:
+                if not path.endswith(MANIFEST_SUFFIX):
+                    sys.exit(f"ERROR: {path} is not a {MANIFEST_SUFFIX} file")
+                unpack(store, path, args.output_dir)
+    finally:
+        store.close()
+    if args.action == "pack":
+        print(f"{store.written} new fragments in {args.store}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
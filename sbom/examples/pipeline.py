@@ -0,0 +1,97 @@
+"""Convert SBOMs between their build and release forms with a chain of transform stages.
+
+Stages run in the order given, over one parsed document (or one package at a time with --stream),
+and the result is written once. For example, to turn a release SBOM of an RPM back into its build
+SBOM:
+
+    python3 pipeline.py -s strip-repository-ids rpm/release/<nvr>.spdx.json -o /tmp
+
+Stages:
+  strip-release         remove tag and repository from the OCI purls of described images
+  strip-repository-ids  remove repository_id qualifiers from RPM purls
+  add-repository-ids    add the repository purls of RPMs (see rpm/release/import_repo_ids.py)
+  add-cpes              add the CPE IDs given with --cpe to the described package
+  sort-refs             sort the external references of packages
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sbomtools.release import (  # noqa: E402
+    STAGES,
+    AddCPEs,
+    AddRepositoryIDs,
+    Pipeline,
+    get_sbom_format,
+)
+from sbomtools.repoids import open_repo_ids  # noqa: E402
+
+REPO_ID_MAP = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "rpm", "release", "repo_id_map.txt"
+)
+
+
+def create_stage(name, sbom_file, args):
+    if name == AddRepositoryIDs.name:
+        sbom_name = os.path.basename(sbom_file).removesuffix(".spdx.json").removesuffix(".cdx.json")
+        try:
+            repo_ids = open_repo_ids(args.repo_ids).get(sbom_name)
+        except FileNotFoundError as e:
+            sys.exit(f"ERROR: {e}")
+        if repo_ids is None:
+            sys.exit(f"ERROR: Repo ID mapping for {sbom_name} not defined!")
+        return AddRepositoryIDs(repo_ids)
+    if name == AddCPEs.name:
+        if not args.cpe:
+            sys.exit(f"ERROR: {name} needs at least one --cpe")
+        return AddCPEs(args.cpe)
+    return STAGES[name]()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("sboms", nargs="+", help="SPDX or CycloneDX SBOM files")
+    parser.add_argument(
+        "-s",
+        "--stage",
+        dest="stages",
+        action="append",
+        choices=STAGES,
+        required=True,
+        help="stage to apply (repeat for more)",
+    )
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write the results to")
+    parser.add_argument(
+        "--repo-ids",
+        metavar="FILE",
+        default=REPO_ID_MAP,
+        help="repository ID mapping for add-repository-ids (default: repo_id_map.txt)",
+    )
+    parser.add_argument("--cpe", action="append", default=[], help="CPE ID for add-cpes")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read SBOMs incrementally to keep memory use bounded by the largest package",
+    )
+    parser.epilog = __doc__.split("\n\n", 1)[1]
+    args = parser.parse_args()
+
+    # The SPDX and CycloneDX SBOMs of the same name (in the same directory) are transformed together
+    groups = {}
+    for sbom_file in args.sboms:
+        if get_sbom_format(sbom_file) is None:
+            sys.exit(f"ERROR: {sbom_file} is neither .spdx.json nor .cdx.json")
+        name = sbom_file.removesuffix(".spdx.json").removesuffix(".cdx.json")
+        output = os.path.join(args.output_dir, os.path.basename(sbom_file))
+        groups.setdefault(name, []).append((sbom_file, output))
+    for files in groups.values():
+        stages = [create_stage(name, files[0][0], args) for name in args.stages]
+        Pipeline(stages).run_all(files, stream=args.stream)
+
+
+if __name__ == "__main__":
+    main()
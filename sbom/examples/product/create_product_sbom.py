@@ -1,7 +1,10 @@
-import json
+import sys
 from pathlib import Path
 from types import SimpleNamespace
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from sbomtools.writer import write_json  # noqa: E402
+
 # A root component package identified by purls containing all the repositories it is available from.
 ubi9_micro_9_4_6_1716471860 = SimpleNamespace(
     name="ubi9-micro-container",
@@ -284,12 +287,10 @@ def main():
     curr_dir = Path(__file__).parent
     for product in (rhel_9_4_main_eus, rhel_9_2_main_eus, rhel_9_eus):
         fname, sbom = create_spdx(product)
-        with open(curr_dir / fname, "w") as fp:
-            fp.write(json.dumps(sbom, indent=2) + "\n")
+        write_json(curr_dir / fname, sbom)
 
         fname, sbom = create_cdx(product)
-        with open(curr_dir / fname, "w") as fp:
-            fp.write(json.dumps(sbom, indent=2) + "\n")
+        write_json(curr_dir / fname, sbom)
 
 
 if __name__ == "__main__":
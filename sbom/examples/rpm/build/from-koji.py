@@ -1,30 +1,90 @@
+import argparse
+import functools
 import hashlib
 import json
 import os
 import re
 import subprocess
 import sys
-import koji
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from copy import deepcopy
 from tempfile import TemporaryDirectory
 
+import koji
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sbomtools.kojiclient import CachingSession  # noqa: E402
+from sbomtools.model import spdx_to_cdx  # noqa: E402
+from sbomtools.recording import (  # noqa: E402
+    FixtureStore,
+    RecordingKojiSession,
+    ReplayKojiSession,
+)
+from sbomtools.rpmheader import read_rpm  # noqa: E402
+from sbomtools.spdxid import SPDXIDAllocator  # noqa: E402
+from sbomtools.srpm import read_srpm, spec_sources  # noqa: E402
+from sbomtools.state import (  # noqa: E402
+    StateStore,
+    file_identity,
+    fingerprint,
+    sbomtools_digest,
+)
+from sbomtools.syftcache import SyftCache, make_key  # noqa: E402
+from sbomtools.writer import COMPRESSION_SUFFIXES, write_json  # noqa: E402
+
 # Script requires these RPMs: brewkoji, rpmdevtools, rpm-build
-# Run with: ./from-koji.py brew <NVR>
+# Run with: ./from-koji.py brew <NVR> [--jobs N] [--state FILE]
 
 SOURCE_RE = re.compile(r"^(Source\d+):\s*((.*/)?(.*))$")
+PATCH_RE = re.compile(r"^(Patch\d+):\s*((.*/)?(.*))$")
+# Paths that the openshift spec files hardcode instead of using macros
+BUILDDIR_PATH = "/builddir/build/BUILD"
+SOURCEDIR_PATH = "/builddir/build/SOURCES"
 TARBALL_RE = re.compile(r"^([^0-9]*)-([0-9a-f\.-]*)[\.-][a-z]")  # Obviously not universal
-KOJI_PROFILE = sys.argv[1]
-BUILD_ID = sys.argv[2]
-PROFILE = koji.get_profile_module(KOJI_PROFILE)
-SESSION = koji.ClientSession(PROFILE.config.server)
+# Header tags of RPMs that --trust-hub takes from the hub instead of reading the files
+HUB_HEADERS = ["license", "sha256header"]
+# Ignore GitHub actions, which are more like build-time dependencies
+SYFT_CATALOGERS = "-github-actions-usage-cataloger,-github-action-workflow-usage-cataloger"
 
 
 class SBOMBuilder:
-    def __init__(self):
+    def __init__(
+        self,
+        session,
+        koji_profile,
+        hash_pool=None,
+        srpm_pool=None,
+        syft_cache=None,
+        state=None,
+        compression=None,
+        trust_hub=False,
+        sigkey=None,
+        verify_rate=0.0,
+    ):
+        self.session = session
+        self.koji_profile = koji_profile
+        self.syft_cache = syft_cache
+        self.state = state
+        self.compression = compression
+        # Use checksums and headers known to the hub instead of downloading and reading each RPM,
+        # checking a deterministic sample of verify_rate of them against the files.
+        self.trust_hub = trust_hub
+        self.sigkey = sigkey
+        self.verify_rate = verify_rate
+        # Optional executors: a process pool to read and hash RPMs and a thread pool to run the
+        # SRPM handling (which mostly waits on subprocesses) alongside it.
+        self.hash_pool = hash_pool
+        self.srpm_pool = srpm_pool
         self.spdx_packages = []
         self.cdx_components = []
         self.spdx_relationships = []
         self.cdx_dependencies = set()
+        # RPM names that only differ in characters SPDX IDs can't have (like foo_bar and foo-bar)
+        # get IDs with a suffix
+        self.spdxids = SPDXIDAllocator()
         self.license_replacements = {
             " and ": " AND ",
             " or ": " OR ",
@@ -32,65 +92,21 @@ class SBOMBuilder:
         }
         self.pkgs_by_arch = {}
 
-    @staticmethod
-    def sanitize_spdxid(value):
-        """ "Emit a valid SPDXRef-"[idstring]"
+    def merge(self, other):
+        """Append everything collected by another builder, keeping its order."""
+        self.spdx_packages.extend(other.spdx_packages)
+        self.cdx_components.extend(other.cdx_components)
+        self.spdx_relationships.extend(other.spdx_relationships)
+        self.spdxids.merge(other.spdxids)
+        for arch, packages in other.pkgs_by_arch.items():
+            self.pkgs_by_arch.setdefault(arch, []).extend(packages)
 
-        where [idstring] is a unique string containing letters, numbers, ., and/or -.
-        """
-        value = value.replace("_", "-")  # Replace underscores with dashes to retain readability
-        # Remove everything else (yes, there is a minor chance for conflicting IDs, but this is an
-        # example script with minimal examples; do not use this in production).
-        return re.sub(r"[^a-zA-Z0-9.-]", "", value)
-
-    def get_license(self, filename):
-        licensep = subprocess.run(
-            stdout=subprocess.PIPE,
-            check=True,
-            args=[
-                "rpm",
-                "-qp",
-                "--qf",
-                "%{LICENSE}",
-                filename,
-            ],
-        )
-        license = licensep.stdout.decode("utf-8")
+    def convert_license(self, license):
         for orig, repl in self.license_replacements.items():
             license = re.sub(orig, repl, license)
 
         return license
 
-    @staticmethod
-    def get_rpm_sha256header(filename):
-        sha256 = subprocess.run(
-            stdout=subprocess.PIPE,
-            check=True,
-            args=[
-                "rpm",
-                "-qp",
-                "--qf",
-                "%{SHA256HEADER}",
-                filename,
-            ],
-        )
-        return sha256.stdout.decode("utf-8")
-
-    @staticmethod
-    def get_rpm_sigmd5(filename):
-        sha256 = subprocess.run(
-            stdout=subprocess.PIPE,
-            check=True,
-            args=[
-                "rpm",
-                "-qp",
-                "--qf",
-                "%{SIGMD5}",
-                filename,
-            ],
-        )
-        return sha256.stdout.decode("utf-8")
-
     @staticmethod
     def get_sha256_checksum(filename):
         h = hashlib.sha256()
@@ -99,22 +115,31 @@ class SBOMBuilder:
                 h.update(chunk)
         return h.hexdigest()
 
-    def run_syft_spdx(self, builddir):
-        syft = subprocess.run(
-            cwd=os.path.dirname(builddir),
-            check=True,
-            stdout=subprocess.PIPE,
-            args=[
-                "syft",
-                "-o",
-                "spdx-json",
-                # Ignore GitHub actions, which are more like build-time dependencies
-                "--select-catalogers",
-                "-github-actions-usage-cataloger,-github-action-workflow-usage-cataloger",
-                os.path.basename(builddir),
-            ],
-        )
-        result = json.loads(syft.stdout)
+    def run_syft(self, builddir):
+        # Catalog the directory once and have syft render both formats from the same scan.
+        with TemporaryDirectory() as outdir:
+            spdx_output = os.path.join(outdir, "syft.spdx.json")
+            cdx_output = os.path.join(outdir, "syft.cdx.json")
+            subprocess.run(
+                cwd=os.path.dirname(builddir),
+                check=True,
+                args=[
+                    "syft",
+                    "-o",
+                    f"spdx-json={spdx_output}",
+                    "-o",
+                    f"cyclonedx-json={cdx_output}",
+                    "--select-catalogers",
+                    SYFT_CATALOGERS,
+                    os.path.basename(builddir),
+                ],
+            )
+            with open(spdx_output) as fp:
+                self.add_syft_spdx(json.load(fp))
+            with open(cdx_output) as fp:
+                self.add_syft_cdx(json.load(fp))
+
+    def add_syft_spdx(self, result):
         syft_pkgs = result.get("packages", [])
         if len(syft_pkgs) < 2:
             return
@@ -155,23 +180,7 @@ class SBOMBuilder:
 
         self.spdx_relationships.extend(filtered_rels)
 
-    def run_syft_cdx(self, builddir):
-        syft = subprocess.run(
-            cwd=os.path.dirname(builddir),
-            check=True,
-            stdout=subprocess.PIPE,
-            args=[
-                "syft",
-                "-o",
-                "cyclonedx-json",
-                # Ignore GitHub actions, which are more like build-time dependencies
-                "--select-catalogers",
-                "-github-actions-usage-cataloger,-github-action-workflow-usage-cataloger",
-                os.path.basename(builddir),
-            ],
-        )
-        result = json.loads(syft.stdout)
-
+    def add_syft_cdx(self, result):
         syft_cdx_components = result.get("components", [])
         if len(syft_cdx_components) < 2:
             return
@@ -229,7 +238,30 @@ class SBOMBuilder:
             url = f"{url}.{ext}"
         return url
 
-    def handle_srpm(self, filename, name, version):
+    def list_sources(self, spec, tags):
+        """Return the Source and Patch lines of the spec, as printed by rpmdev-spectool --all."""
+        lines = spec_sources(spec, tags)
+        if lines is not None:
+            return lines
+
+        # Too complex to parse here, let rpm evaluate it
+        with TemporaryDirectory() as specdir:
+            specfile = os.path.join(specdir, f"{tags['name']}.spec")
+            with open(specfile, "w") as fp:
+                fp.write(spec)
+            spectool = subprocess.run(
+                check=True,
+                stdout=subprocess.PIPE,
+                args=[
+                    "rpmdev-spectool",
+                    "--all",
+                    specfile,
+                ],
+            )
+        return spectool.stdout.decode("utf-8").splitlines()
+
+    def prepare_and_scan(self, filename, name):
+        """Install the SRPM into a scratch tree, prepare its sources and scan them with syft."""
         with TemporaryDirectory(dir=os.getcwd()) as srcdir:
             subprocess.run(
                 check=True,
@@ -249,180 +281,309 @@ class SBOMBuilder:
                     "sed",
                     "-i",
                     "-e",
-                    "s,/builddir/build/BUILD,%{_builddir},",
+                    f"s,{BUILDDIR_PATH},%{{_builddir}},",
                     "-e",
-                    "s,/builddir/build/SOURCES,%{_topdir}/SOURCES,",
+                    f"s,{SOURCEDIR_PATH},%{{_topdir}}/SOURCES,",
                     os.path.join("SPECS", f"{name}.spec"),
                 ],
             )
-            subprocess.run(
-                cwd=srcdir,
-                check=True,
-                args=[
-                    "rpmbuild",
-                    "-D",
-                    f"%_topdir {srcdir}",
-                    "-bp",
-                    "--nodeps",
-                    f"SPECS/{name}.spec",
-                ],
+            return self.scan_build_tree(srcdir, name)
+
+    def handle_srpm(self, filename, name, version):
+        # The spec and the checksums of the sources and patches are read straight from the SRPM
+        # payload; it is only installed and prepared if the syft results aren't cached.
+        tags, spec, payload_digests = read_srpm(filename)
+        # Apply the same openshift spec fix as prepare_and_scan()
+        spec = "\n".join(
+            line.replace(BUILDDIR_PATH, "%{_builddir}", 1).replace(
+                SOURCEDIR_PATH, "%{_topdir}/SOURCES", 1
             )
+            for line in spec.splitlines()
+        )
+        spectool_lines = self.list_sources(spec, tags)
+        source_digests = {}
+        patch_digests = {}
+        for line in spectool_lines:
+            if m := SOURCE_RE.match(line):
+                source_digests[m.group(4)] = payload_digests[m.group(4)]
+            elif m := PATCH_RE.match(line):
+                patch_digests[m.group(4)] = payload_digests[m.group(4)]
+
+        # Unchanged upstream sources and patches scanned with the same syft setup give the
+        # same results, so skip preparing and scanning them if they were seen before.
+        scan_results = None
+        if self.syft_cache:
+            cache_key = make_key(source_digests, patch_digests, get_syft_version(), SYFT_CATALOGERS)
+            scan_results = self.syft_cache.get(cache_key)
+        if scan_results is None:
+            scan_results = self.prepare_and_scan(filename, name)
+            if self.syft_cache:
+                self.syft_cache.put(cache_key, scan_results)
+        self.spdx_packages.extend(scan_results["spdx_packages"])
+        self.spdx_relationships.extend(scan_results["spdx_relationships"])
+        self.cdx_components.extend(scan_results["cdx_components"])
+
+        # Add sources as SPDX packages
+        cdx_pedigrees = []
+        for line in spectool_lines:
+            m = SOURCE_RE.match(line)
+            if not m:
+                continue
 
-            builddir = os.path.join(srcdir, "BUILD")
-            for dirpath, dirnames, _ in os.walk(builddir):
-                if dirpath == builddir:
-                    continue
-                dirnames.clear()
-                self.run_syft_spdx(dirpath)
-                self.run_syft_cdx(dirpath)
+            (source, url, _, sfn) = m.groups()
 
-            # Add sources as SPDX packages
-            spectool = subprocess.run(
-                cwd=srcdir,
-                check=True,
-                stdout=subprocess.PIPE,
-                args=[
-                    "rpmdev-spectool",
-                    "--sources",
-                    f"SPECS/{name}.spec",
+            # Parse filename
+            tarball_match = TARBALL_RE.match(sfn)
+            if not tarball_match:
+                continue
+
+            (sname, sver) = TARBALL_RE.match(sfn).groups()
+
+            cdx_upstream_ancestor = None
+            # See Component Registry for a full worked example of unpacking sources
+            # https://github.com/RedHatProductSecurity/component-registry/blob/
+            #   c05d571ee37fde97a0bf109bcba23e3255df3964/corgi/tasks/sca.py#L296
+            if sname == "openssl":
+                digest = "83049d042a260e696f62406ac5c08bf706fd84383f945cf21bd61e9ed95c396e"
+                alg = "SHA256"
+                ext = re.sub(r".*-hobbled\.", "", sfn)
+                upstream_url = f"https://openssl.org/source/openssl-{sver}.{ext}"
+                url = self.mock_midstream_spdx(digest, alg, source, sname, sver, upstream_url, ext)
+                cdx_upstream_ancestor = self.mock_midstream_cdx(digest, sname, sver, upstream_url)
+
+            # From distgit rpms/tektoncd-cli/tree/source-repos
+            #   ?h=pipelines-1.15-rhel-8&id=c30abfafca5c2865129111a8b7b3e96499d6dbbf
+            elif sname == "tektoncd-cli":
+                digest = "f8b6dc07a0f51f93a138c287ccdc81fbef410554"
+                alg = "SHA1"
+                upstream_url = "https://github.com/tektoncd/cli"
+                url = self.mock_midstream_spdx(digest, alg, source, sname, sver, upstream_url, "")
+                cdx_upstream_ancestor = self.mock_midstream_cdx(digest, sname, sver, upstream_url)
+
+            elif sname == "pipeline-as-code":
+                digest = "cfdf86bdbf1cdfbeadad20747a77294da4bc8c90"
+                alg = "SHA1"
+                upstream_url = "github.com/openshift-pipelines/pipelines-as-code"
+                url = self.mock_midstream_spdx(digest, alg, source, sname, sver, upstream_url, "")
+                cdx_upstream_ancestor = self.mock_midstream_cdx(digest, sname, sver, upstream_url)
+
+            elif sname == "openshift-pipelines-opc":
+                digest = "c5d28fe15a4a8f6d483cdb984bc25d720d9c6631"
+                alg = "SHA1"
+                upstream_url = "github.com/openshift-pipelines/opc"
+                url = self.mock_midstream_spdx(digest, alg, source, sname, sver, upstream_url, "")
+                cdx_upstream_ancestor = self.mock_midstream_cdx(digest, sname, sver, upstream_url)
+
+            if url is None or ":" not in url:
+                url = "NOASSERTION"
+
+            sref = f"SPDXRef-{source}"
+            digest = source_digests[sfn]
+            spackage = {
+                "SPDXID": self.spdxids.allocate(sref),
+                "name": sname,
+                "versionInfo": sver,
+                "downloadLocation": url,
+                "packageFileName": sfn,
+                "checksums": [
+                    {
+                        "algorithm": "SHA256",
+                        "checksumValue": digest,
+                    },
                 ],
-            )
-            cdx_pedigrees = []
-            for line in spectool.stdout.decode("utf-8").splitlines():
-                m = SOURCE_RE.match(line)
-                if not m:
-                    continue
-
-                (source, url, _, sfn) = m.groups()
-
-                # Parse filename
-                tarball_match = TARBALL_RE.match(sfn)
-                if not tarball_match:
-                    continue
-
-                (sname, sver) = TARBALL_RE.match(sfn).groups()
-
-                cdx_upstream_ancestor = None
-                # See Component Registry for a full worked example of unpacking sources
-                # https://github.com/RedHatProductSecurity/component-registry/blob/
-                #   c05d571ee37fde97a0bf109bcba23e3255df3964/corgi/tasks/sca.py#L296
-                if sname == "openssl":
-                    digest = "83049d042a260e696f62406ac5c08bf706fd84383f945cf21bd61e9ed95c396e"
-                    alg = "SHA256"
-                    ext = re.sub(r".*-hobbled\.", "", sfn)
-                    upstream_url = f"https://openssl.org/source/openssl-{sver}.{ext}"
-                    url = self.mock_midstream_spdx(
-                        digest, alg, source, sname, sver, upstream_url, ext
-                    )
-                    cdx_upstream_ancestor = self.mock_midstream_cdx(
-                        digest, sname, sver, upstream_url
-                    )
+            }
+            if not sver:
+                del spackage["versioninfo"]
 
-                # From distgit rpms/tektoncd-cli/tree/source-repos
-                #   ?h=pipelines-1.15-rhel-8&id=c30abfafca5c2865129111a8b7b3e96499d6dbbf
-                elif sname == "tektoncd-cli":
-                    digest = "f8b6dc07a0f51f93a138c287ccdc81fbef410554"
-                    alg = "SHA1"
-                    upstream_url = "https://github.com/tektoncd/cli"
-                    url = self.mock_midstream_spdx(
-                        digest, alg, source, sname, sver, upstream_url, ""
-                    )
-                    cdx_upstream_ancestor = self.mock_midstream_cdx(
-                        digest, sname, sver, upstream_url
-                    )
+            if url != "NOASSERTION":
+                purl = f"pkg:generic/{name}@{version}?download_url={url}"
+                spackage["externalRefs"] = [
+                    {
+                        "referenceCategory": "PACKAGE-MANAGER",
+                        "referenceType": "purl",
+                        "referenceLocator": purl,
+                    }
+                ]
 
-                elif sname == "pipeline-as-code":
-                    digest = "cfdf86bdbf1cdfbeadad20747a77294da4bc8c90"
-                    alg = "SHA1"
-                    upstream_url = "github.com/openshift-pipelines/pipelines-as-code"
-                    url = self.mock_midstream_spdx(
-                        digest, alg, source, sname, sver, upstream_url, ""
-                    )
-                    cdx_upstream_ancestor = self.mock_midstream_cdx(
-                        digest, sname, sver, upstream_url
-                    )
+            cdx_pedigree = self.mock_midstream_cdx(digest, sname, sver, url)
+            if cdx_upstream_ancestor:
+                cdx_pedigree["pedigree"] = {"ancestors": [cdx_upstream_ancestor]}
 
-                elif sname == "openshift-pipelines-opc":
-                    digest = "c5d28fe15a4a8f6d483cdb984bc25d720d9c6631"
-                    alg = "SHA1"
-                    upstream_url = "github.com/openshift-pipelines/opc"
-                    url = self.mock_midstream_spdx(
-                        digest, alg, source, sname, sver, upstream_url, ""
-                    )
-                    cdx_upstream_ancestor = self.mock_midstream_cdx(
-                        digest, sname, sver, upstream_url
-                    )
+            self.pkgs_by_arch.setdefault("src", []).append(spackage)
 
-                if url is None or ":" not in url:
-                    url = "NOASSERTION"
-
-                sref = f"SPDXRef-{source}"
-                digest = self.get_sha256_checksum(os.path.join(srcdir, "SOURCES", sfn))
-                spackage = {
-                    "SPDXID": self.sanitize_spdxid(sref),
-                    "name": sname,
-                    "versionInfo": sver,
-                    "downloadLocation": url,
-                    "packageFileName": sfn,
-                    "checksums": [
-                        {
-                            "algorithm": "SHA256",
-                            "checksumValue": digest,
-                        },
-                    ],
+            self.spdx_relationships.append(
+                {
+                    "spdxElementId": "SPDXRef-SRPM",
+                    "relationshipType": "CONTAINS",
+                    "relatedSpdxElement": sref,
                 }
-                if not sver:
-                    del spackage["versioninfo"]
-
-                if url != "NOASSERTION":
-                    purl = f"pkg:generic/{name}@{version}?download_url={url}"
-                    spackage["externalRefs"] = [
-                        {
-                            "referenceCategory": "PACKAGE-MANAGER",
-                            "referenceType": "purl",
-                            "referenceLocator": purl,
-                        }
-                    ]
+            )
+            cdx_pedigrees.append(cdx_pedigree)
+        return cdx_pedigrees
 
-                cdx_pedigree = self.mock_midstream_cdx(digest, sname, sver, url)
-                if cdx_upstream_ancestor:
-                    cdx_pedigree["pedigree"] = {"ancestors": [cdx_upstream_ancestor]}
+    def scan_build_tree(self, srcdir, name):
+        """Prepare the sources with rpmbuild -bp and scan each unpacked directory with syft."""
+        subprocess.run(
+            cwd=srcdir,
+            check=True,
+            args=[
+                "rpmbuild",
+                "-D",
+                f"%_topdir {srcdir}",
+                "-bp",
+                "--nodeps",
+                f"SPECS/{name}.spec",
+            ],
+        )
 
-                self.pkgs_by_arch.setdefault("src", []).append(spackage)
+        scanner = SBOMBuilder(self.session, self.koji_profile)
+        builddir = os.path.join(srcdir, "BUILD")
+        for dirpath, dirnames, _ in os.walk(builddir):
+            if dirpath == builddir:
+                continue
+            dirnames.clear()
+            scanner.run_syft(dirpath)
 
-                self.spdx_relationships.append(
-                    {
-                        "spdxElementId": "SPDXRef-SRPM",
-                        "relationshipType": "CONTAINS",
-                        "relatedSpdxElement": sref,
-                    }
-                )
-                cdx_pedigrees.append(cdx_pedigree)
-            return cdx_pedigrees
+        return {
+            "spdx_packages": scanner.spdx_packages,
+            "spdx_relationships": scanner.spdx_relationships,
+            "cdx_components": scanner.cdx_components,
+        }
 
-    @staticmethod
-    def download_build(build_id):
+    def download_build(self, build_id, filenames):
         downloaddir = str(build_id)
-        try:
-            os.mkdir(downloaddir)
+        os.makedirs(downloaddir, exist_ok=True)
+        if not all(os.path.exists(filename) for filename in filenames):
             subprocess.run(
                 cwd=str(downloaddir),
                 stdout=None,
                 check=True,
-                args=["koji", "-p", KOJI_PROFILE, "download-build", "--debuginfo", build_id],
+                args=["koji", "-p", self.koji_profile, "download-build", "--debuginfo", build_id],
             )
-        except FileExistsError:
-            pass
         return downloaddir
 
+    def download_rpm(self, downloaddir, rpm, filename):
+        """Download a single RPM of a build, signed with sigkey if set."""
+        if os.path.exists(filename):
+            return
+        args = ["koji", "-p", self.koji_profile, "download-build", "--rpm"]
+        if self.sigkey:
+            args.extend(["--key", self.sigkey])
+        args.append(f"{rpm['nvr']}.{rpm['arch']}")
+        os.makedirs(downloaddir, exist_ok=True)
+        subprocess.run(cwd=downloaddir, stdout=None, check=True, args=args)
+
+    def read_local_rpms(self, filenames):
+        map_fn = self.hash_pool.map if self.hash_pool else map
+        if self.state:
+            return self.state.read_rpms(filenames, map_fn)
+        return list(map_fn(read_rpm, filenames))
+
+    def read_hub_rpms(self, downloaddir, rpms, filenames):
+        """Return read_rpm()-like results for rpms, taken from the hub as far as possible.
+
+        sigmd5 is the payload hash listed for each RPM, and the license and sha256header come
+        from getRPMHeaders. The file checksum is the one the hub has for the copy signed with
+        sigkey; only RPMs without one are downloaded and read. So are the SRPM, which is needed
+        anyway, and a sample of verify_rate of the RPMs, which must match what the hub says.
+        """
+        calls = [("getRPMHeaders", (rpm["id"],), {"headers": HUB_HEADERS}) for rpm in rpms]
+        if self.sigkey:
+            calls += [
+                ("getRPMChecksums", (rpm["id"],), {"checksum_types": ["sha256"]}) for rpm in rpms
+            ]
+        self.session.prefetch(calls)
+
+        rpm_infos = []
+        local = {}
+        for rpm, filename in zip(rpms, filenames):
+            headers = self.session.getRPMHeaders(rpm["id"], headers=HUB_HEADERS)
+            rpm_info = {
+                "license": headers.get("license"),
+                "sha256header": headers.get("sha256header"),
+                "sigmd5": rpm["payloadhash"],
+                "sha256": None,
+            }
+            if self.sigkey:
+                checksums = self.session.getRPMChecksums(rpm["id"], checksum_types=["sha256"])
+                rpm_info["sha256"] = checksums.get(self.sigkey, {}).get("sha256")
+            rpm_infos.append(rpm_info)
+            if (
+                rpm["arch"] == "src"
+                or rpm_info["sha256"] is None
+                or is_sampled(f"{rpm['nvr']}.{rpm['arch']}", self.verify_rate)
+            ):
+                self.download_rpm(downloaddir, rpm, filename)
+                local[filename] = rpm_info
+
+        for (filename, rpm_info), local_info in zip(
+            local.items(), self.read_local_rpms(list(local))
+        ):
+            for key, value in rpm_info.items():
+                if value is not None and value != local_info[key]:
+                    raise RuntimeError(
+                        f"{filename}: {key} {local_info[key]} does not match {value} from the hub"
+                    )
+            rpm_info.update(local_info)
+        return rpm_infos
+
     def process_build(self, build_id, rpmmod):
-        downloaddir = self.download_build(build_id)
+        self.session.prefetch([("getBuild", (build_id,)), ("listBuildRPMs", (build_id,))])
+        build = self.session.getBuild(build_id)
+        rpms = self.session.listBuildRPMs(build_id)
+        downloaddir = str(build_id)
+        filenames = [
+            f"{downloaddir}/{rpm['name']}-{rpm['version']}-{rpm['release']}.{rpm['arch']}.rpm"
+            for rpm in rpms
+        ]
+        if self.trust_hub:
+            # The SRPM is always needed, the other RPMs only in some cases (see read_hub_rpms)
+            local_filenames = []
+            for rpm, filename in zip(rpms, filenames):
+                if rpm["arch"] == "src":
+                    self.download_rpm(downloaddir, rpm, filename)
+                    local_filenames.append(filename)
+        else:
+            self.download_build(build_id, filenames)
+            local_filenames = filenames
+
+        if self.state:
+            # Skip the build entirely if nothing that goes into its SBOMs changed since the last
+            # run and the SBOMs written back then are still in place.
+            build_fingerprint = fingerprint(
+                self.get_sha256_checksum(__file__),
+                sbomtools_digest(),
+                get_syft_version(),
+                rpmmod,
+                build,
+                rpms,
+                [self.trust_hub, self.sigkey, self.verify_rate],
+                [file_identity(filename) for filename in local_filenames],
+            )
+            if self.state.is_up_to_date(build_id, build_fingerprint):
+                print(f"{build_id}: inputs unchanged since the last run, skipping")
+                return
+
+        # The SRPM is handled by a separate builder whose results are merged in at the position of
+        # the SRPM in the RPM listing, so that the output is the same no matter whether it runs
+        # inline or in the background while the binary RPMs are read.
+        srpm_builder = SBOMBuilder(self.session, self.koji_profile, syft_cache=self.syft_cache)
+        srpm_future = None
+        if self.srpm_pool:
+            for rpm, filename in zip(rpms, filenames):
+                if rpm["arch"] == "src":
+                    srpm_future = self.srpm_pool.submit(
+                        srpm_builder.handle_srpm, filename, rpm["name"], rpm["version"]
+                    )
+
+        if self.trust_hub:
+            rpm_infos = self.read_hub_rpms(downloaddir, rpms, filenames)
+        else:
+            rpm_infos = self.read_local_rpms(filenames)
 
-        build = SESSION.getBuild(build_id)
-        rpms = SESSION.listBuildRPMs(build_id)
         cdx_root_component = None
         cdx_pedigrees = []
-        for rpm in rpms:
+        for rpm, filename, rpm_info in zip(rpms, filenames, rpm_infos):
             (name, version, release, nvr, arch, epoch) = (
                 rpm["name"],
                 rpm["version"],
@@ -431,16 +592,17 @@ class SBOMBuilder:
                 rpm["arch"],
                 rpm["epoch"],
             )
-            filename = f"{downloaddir}/{name}-{version}-{release}.{arch}.rpm"
             if arch == "src":
-                spdxid = "SPDXRef-SRPM"
+                spdxid = self.spdxids.allocate("SPDXRef-SRPM")
             else:
-                spdxid = self.sanitize_spdxid(f"SPDXRef-{arch}-{name}")
-
-            license = self.get_license(filename)
-            file_checksum = self.get_sha256_checksum(filename)
-            sha256header = self.get_rpm_sha256header(filename)
-            sigmd5 = self.get_rpm_sigmd5(filename)
+                spdxid = self.spdxids.allocate(f"SPDXRef-{arch}-{name}")
+
+            # All header tags we need and the file checksum were read in a single pass over the
+            # file or come from the hub (rpm -q prints "(none)" for missing tags).
+            license = self.convert_license(rpm_info["license"] or "(none)")
+            file_checksum = rpm_info["sha256"]
+            sha256header = rpm_info["sha256header"] or "(none)"
+            sigmd5 = rpm_info["sigmd5"] or "(none)"
             purl = f"pkg:rpm/redhat/{name}@{version}-{release}?arch={arch}"
             if epoch:
                 purl = f"{purl}&epoch={epoch}"
@@ -488,7 +650,7 @@ class SBOMBuilder:
             }
             self.pkgs_by_arch.setdefault(arch, []).append(package)
             if arch == "src":
-                cdx_root_component = create_cdx_from_spdx(package)
+                cdx_root_component = spdx_to_cdx(package)
                 self.spdx_relationships.append(
                     {
                         "spdxElementId": "SPDXRef-DOCUMENT",
@@ -496,7 +658,11 @@ class SBOMBuilder:
                         "relatedSpdxElement": spdxid,
                     }
                 )
-                cdx_pedigrees = self.handle_srpm(filename, name, version)
+                if srpm_future:
+                    cdx_pedigrees = srpm_future.result()
+                else:
+                    cdx_pedigrees = srpm_builder.handle_srpm(filename, name, version)
+                self.merge(srpm_builder)
             else:
                 self.spdx_relationships.append(
                     {
@@ -513,7 +679,7 @@ class SBOMBuilder:
         for arch_packages in self.pkgs_by_arch.values():
             for package in arch_packages:
                 self.spdx_packages.append(package)
-                self.cdx_components.append(create_cdx_from_spdx(package))
+                self.cdx_components.append(spdx_to_cdx(package))
 
         spdx = {
             "spdxVersion": "SPDX-2.3",
@@ -565,25 +731,89 @@ class SBOMBuilder:
             {"ref": copy_of_cdx_root["bom-ref"], "provides": sorted(list(binary_rpm_purls))}
         ]
 
-        with open(f"{build_id}.spdx.json", "w") as fp:
-            # Add an extra newline at the end since a lot of editors add one when you save a file,
-            # and these files get opened and read in editors a lot.
-            fp.write(json.dumps(spdx, indent=2) + "\n")
+        suffix = {v: k for k, v in COMPRESSION_SUFFIXES.items()}.get(self.compression, "")
+        outputs = {
+            f"{build_id}.spdx.json{suffix}": spdx,
+            f"{build_id}.cdx.json{suffix}": cdx,
+        }
+        for path, doc in outputs.items():
+            self.write_output(path, doc)
+        if self.state:
+            self.state.record_build(build_id, build_fingerprint, list(outputs))
+
+    def write_output(self, path, doc):
+        if self.state:
+            # Leave files alone whose content didn't change since they were last written
+            self.state.write_output(path, doc)
+        else:
+            write_json(path, doc)
+
+
+def is_sampled(nvra, rate):
+    """Deterministically select about a fraction rate of all RPMs, by a hash of their NVRA."""
+    digest = hashlib.sha256(nvra.encode()).digest()
+    return int.from_bytes(digest[:8], "big") < rate * 2**64
+
+
+@functools.cache
+def get_syft_version():
+    syft = subprocess.run(
+        check=True,
+        stdout=subprocess.PIPE,
+        args=["syft", "version", "-o", "json"],
+    )
+    return json.loads(syft.stdout)["version"]
+
+
+def get_build_ids(session, build_id):
+    """Return the builds to process for build_id and the rpmmod qualifier to use for them.
+
+    For a module build, these are all builds tagged into the module, whose metadata is fetched in
+    one go since it is needed for each of them later anyway.
+    """
+    session.prefetch([("getBuild", (build_id,)), ("getBuildType", (build_id,))])
+    if not check_module(session, build_id):
+        return [build_id], ""
+
+    module_tag, module_nsvc = get_modulemd_data(session, build_id)
+    build_ids = [module_build["nvr"] for module_build in session.listTagged(module_tag)]
+    session.prefetch(
+        [("getBuild", (nvr,)) for nvr in build_ids]
+        + [("listBuildRPMs", (nvr,)) for nvr in build_ids]
+    )
+    return build_ids, module_nsvc
+
+
+def process_builds(build_ids, rpmmod, make_builder, jobs):
+    """Process builds, up to jobs of them at a time, without letting one failure stop the rest.
+
+    Returns a list of (build ID, seconds taken, exception or None) tuples in the order of build_ids.
+    """
+
+    def process(build_id):
+        start = time.monotonic()
+        try:
+            make_builder().process_build(build_id, rpmmod)
+        except Exception as e:
+            print(f"ERROR: processing {build_id} failed")
+            traceback.print_exc()
+            return build_id, time.monotonic() - start, e
+        return build_id, time.monotonic() - start, None
 
-        with open(f"{build_id}.cdx.json", "w") as fp:
-            fp.write(json.dumps(cdx, indent=2) + "\n")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(process, build_ids))
 
 
-def check_module():
+def check_module(session, build_id):
     is_module = False
-    build_type_data = SESSION.getBuildType(BUILD_ID)
+    build_type_data = session.getBuildType(build_id)
     if "module" in build_type_data:
         is_module = True
     return is_module
 
 
-def get_modulemd_data():
-    build_info = SESSION.getBuild(BUILD_ID)
+def get_modulemd_data(session, build_id):
+    build_info = session.getBuild(build_id)
 
     build_module = build_info["extra"]["typeinfo"]["module"]
     module_tag = build_module["content_koji_tag"]
@@ -596,46 +826,133 @@ def get_modulemd_data():
     return module_tag, module_nsvc
 
 
-def create_cdx_from_spdx(spdx_data):
-    purl = spdx_data["externalRefs"][0]["referenceLocator"]
-    component = {
-        "bom-ref": purl,
-        "type": "library",
-        "name": spdx_data["name"],
-        "version": spdx_data["versionInfo"],
-        "purl": purl,
-        "hashes": [{"alg": "SHA-256", "content": spdx_data["checksums"][0]["checksumValue"]}],
-    }
-
-    cdx_properties = []
-    annotation_prefixes = ("sigmd5", "sha256header")
-    if "annotations" in spdx_data:
-        for annotation in spdx_data["annotations"]:
-            comment = annotation["comment"]
-            for annotation_prefix in annotation_prefixes:
-                if comment.startswith(annotation_prefix):
-                    annotation_value = comment[(len(annotation_prefix) + 2) :]
-                    cdx_properties.append(
-                        {"name": f"package:rpm:{annotation_prefix}", "value": annotation_value}
-                    )
-    if cdx_properties:
-        component["properties"] = cdx_properties
-    return component
-
-
-is_module = check_module()
-
-build_ids = []
-rpmmod = ""
-if is_module:
-    module_tag, module_nsvc = get_modulemd_data()
-    rpmmod = module_nsvc
-    module_builds = SESSION.listTagged(module_tag)
-    for module_build in module_builds:
-        build_ids.append(module_build["nvr"])
-else:
-    build_ids.append(BUILD_ID)
-
-for id in build_ids:
-    builder = SBOMBuilder()
-    builder.process_build(id, rpmmod)
+def main():
+    parser = argparse.ArgumentParser(description="Generate example SBOMs for a Koji build")
+    parser.add_argument("profile", help="Koji profile to use, e.g. brew")
+    parser.add_argument("build", help="NVR of the build or module build")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of workers used to read RPMs and handle the SRPM concurrently",
+    )
+    parser.add_argument(
+        "--module-jobs",
+        type=int,
+        default=1,
+        help="number of builds tagged into a module that are processed concurrently",
+    )
+    parser.add_argument(
+        "--syft-cache",
+        metavar="DIR",
+        help="cache syft results for unchanged upstream sources and patches in this directory",
+    )
+    parser.add_argument(
+        "--syft-cache-size",
+        metavar="MB",
+        type=int,
+        default=1024,
+        help="maximum size of the syft cache before least recently used entries are evicted",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sorted(COMPRESSION_SUFFIXES.values()),
+        help="write compressed SBOMs (zstd requires the zstandard package)",
+    )
+    parser.add_argument(
+        "--koji-cache",
+        metavar="DIR",
+        help="cache metadata of completed builds from the hub in this directory",
+    )
+    parser.add_argument(
+        "--state",
+        metavar="FILE",
+        help="SQLite database recording previous runs; unchanged builds and files are skipped",
+    )
+    parser.add_argument(
+        "--trust-hub",
+        action="store_true",
+        help="use RPM checksums and headers from the hub; only download RPMs when needed",
+    )
+    parser.add_argument(
+        "--sigkey",
+        help="with --trust-hub, use the checksums of RPMs signed with this key (lowercase ID); "
+        "without one, every RPM is downloaded to compute its SHA-256",
+    )
+    parser.add_argument(
+        "--verify-rate",
+        metavar="FRACTION",
+        type=float,
+        default=0.0,
+        help="with --trust-hub, download and check this fraction of RPMs against the hub",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        metavar="DIR",
+        help="save all hub responses to DIR for --replay",
+    )
+    recording.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="answer hub calls from responses saved with --record, offline (RPMs and SRPMs are "
+        "still downloaded when needed; see --trust-hub, --state and --syft-cache)",
+    )
+    args = parser.parse_args()
+
+    syft_cache = None
+    if args.syft_cache:
+        syft_cache = SyftCache(args.syft_cache, args.syft_cache_size * 1024 * 1024)
+
+    state = None
+    if args.state:
+        state = StateStore(args.state)
+
+    if args.replay:
+        hub = ReplayKojiSession(FixtureStore(args.replay))
+    else:
+        profile = koji.get_profile_module(args.profile)
+        hub = koji.ClientSession(profile.config.server)
+        if args.record:
+            hub = RecordingKojiSession(hub, FixtureStore(args.record))
+    # Calls answered from the cache wouldn't be recorded
+    session = CachingSession(hub, None if args.record else args.koji_cache)
+
+    build_ids, rpmmod = get_build_ids(session, args.build)
+
+    with ExitStack() as stack:
+        hash_pool = srpm_pool = None
+        if args.jobs > 1:
+            hash_pool = stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs))
+            srpm_pool = stack.enter_context(ThreadPoolExecutor(max_workers=args.jobs))
+
+        results = process_builds(
+            build_ids,
+            rpmmod,
+            lambda: SBOMBuilder(
+                session,
+                args.profile,
+                hash_pool,
+                srpm_pool,
+                syft_cache,
+                state,
+                args.compress,
+                args.trust_hub,
+                args.sigkey,
+                args.verify_rate,
+            ),
+            args.module_jobs,
+        )
+
+    if len(results) > 1:
+        print("Summary:")
+        for build_id, seconds, error in results:
+            status = f"FAILED ({error!r})" if error else "done"
+            print(f"  {build_id}: {status} in {seconds:.1f}s")
+    if any(error for _, _, error in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
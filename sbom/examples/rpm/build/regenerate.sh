@@ -2,6 +2,7 @@
 
 packages=("openssl-3.0.7-18.el9_2" "openshift-pipelines-client-1.14.3-11352.el8" "poppler-21.01.0-19.el9" "go-toolset-rhel8-8060020250609110611.97d7f71f" "vim-9.1.083-5.el10")
 
+# Reruns only redo builds whose inputs changed since the last run
 for example in "${packages[@]}"; do
-    python3 from-koji.py "$@" "${example}"
+    python3 from-koji.py --state .from-koji-state.sqlite "$@" "${example}"
 done
@@ -1,169 +1,115 @@
-import json
+import argparse
+import os
 import sys
-
-from packageurl import PackageURL
-
-repo_id_map = {
-    # https://access.redhat.com/downloads/content/openshift-pipelines-client/1.15.0-11496.el8/x86_64/fd431d51/package
-    "openshift-pipelines-client-1.14.3-11352.el8": ["pipelines-1.14-for-rhel-8-{arch}-rpms"],
-    # https://access.redhat.com/downloads/content/openssl/3.0.7-18.el9_2/x86_64/fd431d51/package
-    "openssl-3.0.7-18.el9_2": [
-        "rhel-9-for-{arch}-baseos-eus-rpms",
-        "rhel-9-for-{arch}-baseos-aus-rpms",
-        "rhel-9-for-{arch}-baseos-e4s-rpms",
-    ],
-    # https://access.redhat.com/downloads/content/poppler/21.01.0-19.el9/x86_64/fd431d51/package
-    "poppler-21.01.0-19.el9": [
-        "rhel-9-for-{arch}-appstream-rpms",
-        "rhel-9-for-{arch}-baseos-eus-rpms",
-        "rhel-9-for-{arch}-baseos-aus-rpms",
-        "rhel-9-for-{arch}-baseos-e4s-rpms",
-    ],
-    # https://access.redhat.com/downloads/content/delve/1.7.2-1.module+el8.6.0+12972+ebab5911/x86_64/fd431d51/package
-    "delve-1.7.2-1.module+el8.6.0+12972+ebab5911": [
-        "rhel-8-for-{arch}-appstream-rpms",
-        "rhel-8-for-{arch}-appstream-eus-rpms",
-        "rhel-8-for-{arch}-appstream-aus-rpms",
-        "rhel-8-for-{arch}-appstream-tus-rpms",
-        "rhel-8-for-{arch}-appstream-e4s-rpms",
-    ],
-    # https://access.redhat.com/downloads/content/go-toolset/1.17.13-2.module+el8.6.0+22782+bd95fb4c/x86_64/fd431d51/package
-    "go-toolset-1.17.13-2.module+el8.6.0+22782+bd95fb4c": [
-        "rhel-8-for-{arch}-appstream-aus-rpms",
-        "rhel-8-for-{arch}-appstream-tus-rpms",
-        "rhel-8-for-{arch}-appstream-e4s-rpms",
-    ],
-    # https://access.redhat.com/downloads/content/golang/1.17.13-9.module+el8.6.0+23245+b36ba85c/x86_64/fd431d51/package
-    "golang-1.17.13-9.module+el8.6.0+23245+b36ba85c": [
-        "rhel-8-for-{arch}-appstream-aus-rpms",
-        "rhel-8-for-{arch}-appstream-tus-rpms",
-        "rhel-8-for-{arch}-appstream-e4s-rpms",
-    ],
-    # https://access.redhat.com/downloads/content/vim-minimal/9.1.083-5.el10/x86_64/fd431d51/package
-    "vim-9.1.083-5.el10": [
-        "rhel-10-for-{arch}-baseos-rpms",
-        "rhel-10-for-{arch}-baseos-eus-rpms",
-        "rhel-10-for-{arch}-baseos-e4s-rpms",
-    ],
-}
-
-
-def get_rpm_purl(ext_refs):
-    purl_str = next(
-        (ref["referenceLocator"] for ref in ext_refs if ref["referenceType"] == "purl"),
-        None,
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sbomtools.release import SBOM_FORMATS, AddRepositoryIDs, Pipeline  # noqa: E402
+from sbomtools.repoids import open_repo_ids  # noqa: E402
+
+# Default mapping of NVRs to repository IDs, see import_repo_ids.py for large ones
+REPO_ID_MAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repo_id_map.txt")
+
+
+def get_sbom_name(sbom_file):
+    return sbom_file.rsplit("/", 1)[-1].removesuffix(".spdx.json").removesuffix(".cdx.json")
+
+
+def add_release_data(sbom_files, output_dir=".", repo_id_map=REPO_ID_MAP, stream=False):
+    """Add release data to the SBOMs of one build and write the results (once) to output_dir.
+
+    sbom_files are its SPDX and/or CycloneDX SBOM; the repository IDs of each package are worked
+    out once for both. repo_id_map is the path of a repository ID mapping (see
+    sbomtools.repoids.open_repo_ids). With stream, the SBOMs are read twice, one component at a
+    time, instead of loading them whole. Returns an error message, or None on success.
+    """
+    sbom_name = get_sbom_name(sbom_files[0])
+
+    repo_ids = open_repo_ids(repo_id_map).get(sbom_name)
+    if repo_ids is None:
+        return f"ERROR: Repo ID mapping for {sbom_name} not defined!"
+
+    files = [
+        (sbom_file, os.path.join(output_dir, f"{sbom_name}{suffix}"))
+        for sbom_file in sbom_files
+        for suffix in SBOM_FORMATS
+        if sbom_file.endswith(suffix)
+    ]
+    if files:
+        Pipeline([AddRepositoryIDs(repo_ids)]).run_all(files, stream=stream)
+    return None
+
+
+def find_sboms(paths):
+    """Expand directories in paths to the SPDX and CycloneDX SBOMs they contain."""
+    sbom_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            sbom_files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith((".spdx.json", ".cdx.json"))
+            )
+        else:
+            sbom_files.append(path)
+    return sbom_files
+
+
+def group_sboms(sbom_files):
+    """Group the SBOMs of the same build: those with the same name in the same directory."""
+    groups = {}
+    for sbom_file in sbom_files:
+        key = sbom_file.removesuffix(".spdx.json").removesuffix(".cdx.json")
+        groups.setdefault(key, []).append(sbom_file)
+    return list(groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add release data to example RPM SBOMs")
+    parser.add_argument("sboms", nargs="+", help="SBOM files, or directories containing them")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="number of builds whose SBOMs are processed concurrently (default: number of CPUs)",
+    )
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write the results to")
+    parser.add_argument(
+        "--repo-ids",
+        metavar="FILE",
+        default=REPO_ID_MAP,
+        help="repository ID mapping: a database created by import_repo_ids.py, or a JSON or text "
+        "file (default: repo_id_map.txt)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read SBOMs incrementally to keep memory use bounded by the largest component",
     )
-    print(purl_str)
-    if purl_str is None or (not purl_str.startswith("pkg:rpm/redhat")):
-        return None
-    return PackageURL.from_string(purl_str)
-
-
-sbom_file = sys.argv[1]
-sbom_name = sbom_file.rsplit("/", 1)[-1].removesuffix(".spdx.json").removesuffix(".cdx.json")
-
-if sbom_name not in repo_id_map:
-    print(f"ERROR: Repo ID mapping for {sbom_name} not defined!")
-    sys.exit(1)
-
-if sbom_file.endswith(".spdx.json"):
-    with open(sbom_file) as fp:
-        sbom = json.load(fp)
-
-    all_arches = set()
-    for components in sbom["packages"]:
-        purl = get_rpm_purl(components.get("externalRefs", []))
-        if purl is not None and purl.qualifiers["arch"] != "src":
-            all_arches.add(purl.qualifiers["arch"])
-
-    for components in sbom["packages"]:
-        purl = get_rpm_purl(components.get("externalRefs", []))
-        if purl is None:
-            continue
-
-        new_refs = []
-        for repo_id in repo_id_map[sbom_name]:
-            if purl.qualifiers["arch"] == "src":
-                for arch in all_arches:
-                    purl.qualifiers["repository_id"] = (
-                        repo_id.format(arch=arch).removesuffix("-rpms") + "-source-rpms"
-                    )
-                    release_ref = {
-                        "referenceCategory": "PACKAGE-MANAGER",
-                        "referenceType": "purl",
-                        "referenceLocator": purl.to_string(),
-                    }
-                    new_refs.append(release_ref)
-            else:
-                if purl.name.endswith("-debugsource"):
-                    repo_id = repo_id.removesuffix("-rpms") + "-source-rpms"
-                elif purl.name.endswith("-debuginfo"):
-                    repo_id = repo_id.replace("-rpms", "-debug-rpms")
-                purl.qualifiers["repository_id"] = repo_id.format(arch=purl.qualifiers["arch"])
-                release_ref = {
-                    "referenceCategory": "PACKAGE-MANAGER",
-                    "referenceType": "purl",
-                    "referenceLocator": purl.to_string(),
-                }
-                new_refs.append(release_ref)
-
-        components["externalRefs"] = sorted(new_refs, key=lambda ref: ref["referenceLocator"])
-
-        with open(f"{sbom_name}.spdx.json", "w") as fp:
-            # Add an extra newline at the end since a lot of editors add one when you save a file,
-            # and these files get opened and read in editors a lot.
-            fp.write(json.dumps(sbom, indent=2) + "\n")
-
-elif sbom_file.endswith(".cdx.json"):
-    with open(sbom_file) as fp:
-        sbom = json.load(fp)
-
-    all_arches = set()
-    for component in sbom["components"]:
-        purl = component.get("purl")
-        if not purl.startswith("pkg:rpm/redhat"):
-            continue
-        purl_obj = PackageURL.from_string(purl)
-        if purl_obj.qualifiers["arch"] == "src":
-            continue
-        all_arches.add(purl_obj.qualifiers["arch"])
-
-    for component in sbom["components"]:
-        purl = component.get("purl")
-        if not purl.startswith("pkg:rpm/redhat"):
-            continue
-
-        purl_data = PackageURL.from_string(purl)
-
-        new_refs = []
-        for repo_id in sorted(repo_id_map[sbom_name]):
-            if purl_data.qualifiers["arch"] == "src":
-                for arch in sorted(all_arches):
-                    purl_data.qualifiers["repository_id"] = (
-                        repo_id.format(arch=arch).removesuffix("-rpms") + "-source-rpms"
-                    )
-                    release_ref = {
-                        "field": "purl",
-                        "concludedValue": purl_data.to_string(),
-                    }
-                    new_refs.append(release_ref)
-            else:
-                if purl_data.name.endswith("-debugsource"):
-                    repo_id = repo_id.removesuffix("-rpms") + "-source-rpms"
-                elif purl_data.name.endswith("-debuginfo"):
-                    repo_id = repo_id.replace("-rpms", "-debug-rpms")
-                purl_data.qualifiers["repository_id"] = repo_id.format(
-                    arch=purl_data.qualifiers["arch"]
-                )
-                release_ref = {
-                    "field": "purl",
-                    "concludedValue": purl_data.to_string(),
-                }
-                new_refs.append(release_ref)
-
-        component["evidence"] = {"identity": new_refs}
-
-        with open(f"{sbom_name}.cdx.json", "w") as fp:
-            # Add an extra newline at the end since a lot of editors add one when you save a file,
-            # and these files get opened and read in editors a lot.
-            fp.write(json.dumps(sbom, indent=2) + "\n")
+    args = parser.parse_args()
+
+    try:
+        open_repo_ids(args.repo_ids)
+    except FileNotFoundError as e:
+        sys.exit(f"ERROR: {e}")
+    groups = group_sboms(find_sboms(args.sboms))
+    output_dirs = [args.output_dir] * len(groups)
+    repo_id_maps = [args.repo_ids] * len(groups)
+    streams = [args.stream] * len(groups)
+    map_args = (add_release_data, groups, output_dirs, repo_id_maps, streams)
+    if args.jobs > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            errors = list(pool.map(*map_args))
+    else:
+        errors = list(map(*map_args))
+
+    errors = [error for error in errors if error]
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Import NVR to repository ID mappings into a database for add_release_data.py --repo-ids.
+
+Mappings are either JSON files, or text files like repo_id_map.txt with one build per line:
+
+    <nvr> <repository ID template> [<repository ID template> ...]
+
+Lines starting with "#" are comments.
+
+Templates contain an {arch} placeholder. The repository IDs of the examples are taken from the
+Red Hat customer portal, e.g.
+https://access.redhat.com/downloads/content/openssl/3.0.7-18.el9_2/x86_64/fd431d51/package
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sbomtools.repoids import RepoIDStore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("database", help="SQLite database to create or update")
+    parser.add_argument("mappings", nargs="+", help="JSON or text files with mappings")
+    args = parser.parse_args()
+
+    store = RepoIDStore(args.database)
+    for path in args.mappings:
+        store.import_file(path)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
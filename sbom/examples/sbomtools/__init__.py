@@ -0,0 +1,5 @@
+"""Helpers shared by the example SBOM generation scripts.
+
+The scripts in the sibling directories are run directly (e.g. ``python3 from-koji.py``), so they
+add this directory's parent to ``sys.path`` before importing from here.
+"""
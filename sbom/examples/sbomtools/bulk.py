@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+PROGRESS_INTERVAL = 100
+
+
+def read_items(path):
+    """Yield the items (e.g. NVRs) listed one per line in path ("-" for stdin).
+
+    Empty lines and lines starting with "#" are skipped. The file is read lazily, so huge lists
+    can be piped in.
+    """
+    fp = sys.stdin if path == "-" else open(path)
+    try:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+
+class Journal:
+    """Append-only JSON lines file recording which items of a bulk run are done.
+
+    Each processed item is written (and synced to disk) as soon as it is finished, so that a run
+    that crashed or was interrupted can be resumed by skipping the items already done. Failed
+    items are recorded too, but are retried on the next run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    if entry.get("status") == "done":
+                        self.done.add(entry["item"])
+        self.fp = open(path, "a")
+
+    def record(self, item, status, **fields):
+        line = json.dumps({"item": item, "status": status, **fields}) + "\n"
+        with self.lock:
+            self.fp.write(line)
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+            if status == "done":
+                self.done.add(item)
+
+    def close(self):
+        self.fp.close()
+
+
+class StageTimer:
+    """Accumulates the time spent in named stages of processing, across threads."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.seconds[name] += elapsed
+                self.counts[name] += 1
+
+    def report(self):
+        """Return a line per stage with the number of runs, total time and runs per second."""
+        with self.lock:
+            return [
+                f"{name}: {self.counts[name]} in {seconds:.1f}s "
+                f"({self.counts[name] / seconds if seconds else 0:.1f}/s per worker)"
+                for name, seconds in self.seconds.items()
+            ]
+
+
+def run_bulk(items, function, workers=1, journal=None, log=sys.stderr):
+    """Call function(item) for all items on a pool of workers and return the failed items.
+
+    Only a bounded number of items is read ahead, so items may come from a huge or endless
+    iterable. Items already done according to journal are skipped; results are recorded in it.
+    Errors (including sys.exit() calls) are reported to log and don't stop the run.
+    """
+    failed = []
+    finished = 0
+    start = time.perf_counter()
+
+    def process(item):
+        item_start = time.perf_counter()
+        try:
+            function(item)
+        except (Exception, SystemExit) as e:
+            error = str(e) or type(e).__name__
+            print(f"ERROR: {item}: {error}", file=log)
+            if journal:
+                journal.record(item, "failed", error=error)
+            return item, False
+        if journal:
+            journal.record(item, "done", seconds=round(time.perf_counter() - item_start, 3))
+        return item, True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for item in items:
+            if journal and item in journal.done:
+                continue
+            pending.add(pool.submit(process, item))
+            if len(pending) < 2 * workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, ok = future.result()
+                if not ok:
+                    failed.append(item)
+                finished += 1
+                if finished % PROGRESS_INTERVAL == 0:
+                    rate = finished / (time.perf_counter() - start)
+                    print(f"{finished} items done ({rate:.1f}/s)", file=log)
+        for future in pending:
+            item, ok = future.result()
+            if not ok:
+                failed.append(item)
+            finished += 1
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{finished} items in {elapsed:.1f}s ({finished / elapsed if elapsed else 0:.1f}/s), "
+        f"{len(failed)} failed",
+        file=log,
+    )
+    return failed
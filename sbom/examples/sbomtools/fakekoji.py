@@ -0,0 +1,149 @@
+import json
+
+# Hub calls implemented by FakeKojiSession, mapped to the methods implementing them
+HUB_METHODS = {
+    "getBuild": "get_build",
+    "getBuildType": "get_build_type",
+    "getRPMChecksums": "get_rpm_checksums",
+    "getRPMHeaders": "get_rpm_headers",
+    "listArchives": "list_archives",
+    "listBuildRPMs": "list_build_rpms",
+    "listTagged": "list_tagged",
+}
+
+
+class _VirtualCall:
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+
+
+class FakeMultiCall:
+    """Multicall of a session that answers hub calls itself, like FakeKojiSession.
+
+    Calls are sent in batches of batch (all at once by default) when the context is left: each
+    batch counts as a round trip of hub and each call is passed to hub.dispatch().
+    """
+
+    def __init__(self, hub, batch=None):
+        self.hub = hub
+        self.batch = batch
+        self.calls = []
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            virtual_call = _VirtualCall(method, args, kwargs)
+            self.calls.append(virtual_call)
+            return virtual_call
+
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            return
+        batch = self.batch or len(self.calls) or 1
+        for start in range(0, len(self.calls), batch):
+            self.hub.round_trips += 1
+            for virtual_call in self.calls[start : start + batch]:
+                virtual_call.result = self.hub.dispatch(
+                    virtual_call.method, virtual_call.args, virtual_call.kwargs
+                )
+
+
+class FakeKojiSession:
+    """Offline stand-in for koji.ClientSession serving builds from fixture data.
+
+    It implements the few hub calls used by the example scripts, including multicall, and counts
+    round trips to the hub so the effect of batching and memoization can be measured.
+
+    Fixture data is a dict (or a JSON file containing one) of the form:
+
+        {
+            "builds": {"<nvr>": {<getBuild result>, "rpms": [...], "archives": [...]}},
+            "tags": {"<tag>": ["<nvr>", ...]},
+        }
+
+    Entries of "rpms" are listBuildRPMs results, optionally with the "headers" and "checksums"
+    (keyed by signing key) that getRPMHeaders and getRPMChecksums return for them.
+    """
+
+    def __init__(self, fixtures):
+        if isinstance(fixtures, str):
+            with open(fixtures) as fp:
+                fixtures = json.load(fp)
+        self.builds = {}
+        self.rpms = {}
+        self.tags = fixtures.get("tags", {})
+        self.round_trips = 0
+        for nvr, build in fixtures["builds"].items():
+            self.builds[nvr] = self.builds[build["id"]] = build
+            for rpm in build.get("rpms", []):
+                if "id" in rpm:
+                    self.rpms[rpm["id"]] = rpm
+
+    def __getattr__(self, method):
+        if method not in HUB_METHODS:
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            self.round_trips += 1
+            return self.dispatch(method, args, kwargs)
+
+        return call
+
+    def dispatch(self, method, args, kwargs):
+        return getattr(self, HUB_METHODS[method])(*args, **kwargs)
+
+    def multicall(self, strict=False, batch=None):
+        return FakeMultiCall(self, batch)
+
+    def _build(self, build_info):
+        if isinstance(build_info, str) and build_info.isdigit():
+            build_info = int(build_info)
+        return self.builds.get(build_info)
+
+    def get_build(self, build_info, strict=False):
+        build = self._build(build_info)
+        if build is None:
+            if strict:
+                raise KeyError(f"No such build: {build_info}")
+            return None
+        return {k: v for k, v in build.items() if k not in ("rpms", "archives", "btypes")}
+
+    def get_build_type(self, build_info, strict=False):
+        build = self._build(build_info)
+        return build.get("btypes", {"rpm": None}) if build else {}
+
+    def list_build_rpms(self, build):
+        return [
+            {k: v for k, v in rpm.items() if k not in ("headers", "checksums")}
+            for rpm in self._build(build).get("rpms", [])
+        ]
+
+    def get_rpm_headers(self, rpm_id=None, task_id=None, filepath=None, headers=None, strict=False):
+        rpm_headers = self.rpms[rpm_id].get("headers", {})
+        return {header: rpm_headers.get(header) for header in headers or rpm_headers}
+
+    def get_rpm_checksums(self, rpm_id, checksum_types=None, cacheonly=False):
+        return {
+            sigkey: {
+                checksum_type: value
+                for checksum_type, value in checksums.items()
+                if not checksum_types or checksum_type in checksum_types
+            }
+            for sigkey, checksums in self.rpms[rpm_id].get("checksums", {}).items()
+        }
+
+    def list_archives(self, build_id=None, **kwargs):
+        return self._build(build_id).get("archives", [])
+
+    def list_tagged(self, tag, **kwargs):
+        return [self.get_build(nvr) for nvr in self.tags.get(tag, [])]
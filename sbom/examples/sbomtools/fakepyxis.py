@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive connections need HTTP/1.1, and without Nagle's algorithm the separately written
+    # headers and body of a response aren't held back waiting for an ACK.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        server = self.server.fake
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.removeprefix(server.prefix)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        status, body = server.respond(path, params)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        with self.fake.lock:
+            self.fake.connections += 1
+        super().process_request(request, client_address)
+
+
+class FakePyxisServer:
+    """Local HTTP stand-in for the container catalog API serving recorded responses.
+
+    responses maps API paths (e.g. "images/nvr/<nvr>") to the JSON they return. Responses with a
+    "data" list are paged like the real API. Each request can be delayed to simulate latency, and
+    the first requests to a path can be made to fail with failures (path to number of 503s).
+    Requests and connections are counted to measure the effect of connection reuse.
+
+    Use as a context manager; the base URL for sbomtools.pyxis.PyxisClient is in url.
+    """
+
+    prefix = "/api/containers/v1/"
+
+    def __init__(self, responses, delay=0.0, failures=None):
+        self.responses = responses
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.httpd.fake = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}{self.prefix}"
+        self.thread = None
+
+    def respond(self, path, params):
+        with self.lock:
+            self.requests += 1
+            failing = self.failures.get(path, 0) > 0
+            if failing:
+                self.failures[path] -= 1
+        if self.delay:
+            time.sleep(self.delay)
+        if failing:
+            return 503, {"detail": "Service Unavailable"}
+        if path not in self.responses:
+            return 404, {"detail": "Not Found"}
+        body = self.responses[path]
+        if "data" in body:
+            page_size = int(params.get("page_size", 100))
+            page = int(params.get("page", 0))
+            data = body["data"][page * page_size : (page + 1) * page_size]
+            body = {**body, "data": data, "page": page, "page_size": page_size}
+            body["total"] = len(self.responses[path]["data"])
+        return 200, body
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import zlib
+
+from .model import PACKAGE_LISTS, get_format
+from .writer import file_mode, write_json
+
+MANIFEST_SUFFIX = ".manifest.json"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+    digest BLOB PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+# The RPM architectures of the arches of container images
+RPM_ARCHES = {"amd64": "x86_64", "arm64": "aarch64"}
+
+# Variables are replaced by their index between two NUL characters, which don't occur in SBOMs.
+_PLACEHOLDER = re.compile("\x00([0-9]+)\x00")
+
+
+def arch_variables(arch):
+    """Return the variables of an arch-specific image SBOM for FragmentStore.pack().
+
+    These are the RPM arch (as in purls and file names), the same as used in SPDX IDs and the
+    image arch, so that e.g. the noarch packages of all arches of an image are stored once.
+    """
+    rpm_arch = RPM_ARCHES.get(arch, arch)
+    return [rpm_arch, rpm_arch.replace("_", "-"), arch]
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(data)
+    os.chmod(tmp_path, file_mode())
+    os.replace(tmp_path, path)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _substitute(value, pattern, indexes):
+    if isinstance(value, str):
+        if "\x00" in value:
+            raise ValueError("string contains a NUL character")
+        return pattern.sub(lambda match: f"\x00{indexes[match[0]]}\x00", value)
+    if isinstance(value, dict):
+        return {
+            _substitute(key, pattern, indexes): _substitute(item, pattern, indexes)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_substitute(item, pattern, indexes) for item in value]
+    return value
+
+
+def _expand(value, variables):
+    if isinstance(value, str):
+        return _PLACEHOLDER.sub(lambda match: variables[int(match[1])], value)
+    if isinstance(value, dict):
+        return {_expand(key, variables): _expand(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item, variables) for item in value]
+    return value
+
+
+class FragmentStore:
+    """Content-addressed store of the packages of SBOMs, shared by all documents written to it.
+
+    A document is packed into a manifest that holds everything but its packages (or components),
+    which are replaced by the SHA-256 of their JSON. Each distinct package is stored once, so
+    packages that are in many SBOMs (like those of parent images) take space only once. Packages
+    are (zlib-compressed) rows of an SQLite database keyed by their digest rather than files of
+    their own, which would each take a filesystem block; the packages of a document are added in
+    one transaction.
+
+    Packages of the arch-specific SBOMs of an image mostly differ only in the arch (e.g. in the
+    repository IDs of noarch RPMs). The strings given as variables are replaced by placeholders
+    before packages are hashed, and put back when the manifest is unpacked, so these are stored
+    once as well. Unpacked documents are identical to the original ones, and write_unpacked() gives
+    the same bytes as writer.write_json() would.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.known = set()
+        self.lock = threading.Lock()
+        self.written = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def put(self, value):
+        """Store value (unless stored already) and return its digest."""
+        return self.put_all([value])[0]
+
+    def put_all(self, values):
+        """Store values (those not stored already) and return their digests."""
+        digests = []
+        fragments = {}
+        for value in values:
+            data = _dumps(value)
+            digest = hashlib.sha256(data).hexdigest()
+            digests.append(digest)
+            fragments.setdefault(digest, data)
+        with self.lock:
+            new = [
+                (bytes.fromhex(digest), zlib.compress(data))
+                for digest, data in fragments.items()
+                if digest not in self.known
+            ]
+            if new:
+                with self.db:
+                    cursor = self.db.executemany(
+                        "INSERT OR IGNORE INTO fragments VALUES (?, ?)", new
+                    )
+                self.written += cursor.rowcount
+            self.known.update(fragments)
+        return digests
+
+    def get(self, digest):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT data FROM fragments WHERE digest = ?", (bytes.fromhex(digest),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"fragment {digest} not in {self.path}")
+        return json.loads(zlib.decompress(row[0]))
+
+    def pack(self, doc, variables=()):
+        """Store the packages of doc and return its manifest."""
+        packages_key = PACKAGE_LISTS[get_format(doc)]
+        variables = list(variables)
+        # The first of equal variables is used, and longer ones are matched first
+        indexes = {}
+        for index, variable in enumerate(variables):
+            if variable:
+                indexes.setdefault(variable, index)
+        pattern = re.compile("|".join(map(re.escape, sorted(indexes, key=len, reverse=True))))
+        try:
+            templates = [
+                _substitute(package, pattern, indexes) if indexes else package
+                for package in doc.get(packages_key, [])
+            ]
+        except ValueError:
+            # Placeholders couldn't be told apart from the content; store the packages as they are
+            variables = []
+            templates = doc.get(packages_key, [])
+        document = dict(doc)
+        if packages_key in doc:
+            document[packages_key] = self.put_all(templates)
+        return {"variables": variables, "packagesKey": packages_key, "document": document}
+
+    def unpack(self, manifest):
+        """Return the document of manifest, with its packages read from the store."""
+        doc = dict(manifest["document"])
+        packages_key = manifest["packagesKey"]
+        variables = manifest["variables"]
+        if packages_key in doc:
+            doc[packages_key] = [
+                _expand(self.get(digest), variables) if variables else self.get(digest)
+                for digest in doc[packages_key]
+            ]
+        return doc
+
+    def write(self, path, doc, variables=()):
+        """Pack doc and write its manifest (as compact JSON) to path + MANIFEST_SUFFIX."""
+        _write_atomic(path + MANIFEST_SUFFIX, _dumps(self.pack(doc, variables)))
+
+    def write_unpacked(self, manifest_path, path=None):
+        """Write the document of the manifest at manifest_path to path.
+
+        path defaults to manifest_path without MANIFEST_SUFFIX, i.e. the path it was packed from.
+        """
+        with open(manifest_path) as fp:
+            manifest = json.load(fp)
+        if path is None:
+            path = manifest_path.removesuffix(MANIFEST_SUFFIX)
+        return write_json(path, self.unpack(manifest))
@@ -0,0 +1,80 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+
+class GitMirror:
+    """Pool of bare mirrors of git repositories, for reading single files at given commits.
+
+    Each repository is cloned once (without a worktree) into cache_dir and only fetched again
+    when a commit isn't in the mirror yet. Files are read from the object database directly and
+    memoized by (repository, commit, path). Mirrors are locked while they are updated, so
+    cache_dir can be shared by concurrent threads and processes.
+
+    Without cache_dir, mirrors are kept in a temporary directory until close() is called.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.temporary = cache_dir is None
+        self.cache_dir = tempfile.mkdtemp(prefix="gitmirror-") if cache_dir is None else cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.memo = {}
+        self.lock = threading.Lock()
+        self.repo_locks = {}
+
+    def _path(self, url):
+        name = url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+        return os.path.join(
+            self.cache_dir, f"{name}-{hashlib.sha256(url.encode()).hexdigest()[:16]}.git"
+        )
+
+    def _git(self, path, *args, check=True):
+        return subprocess.run(["git", "--git-dir", path, *args], capture_output=True, check=check)
+
+    def _has_commit(self, path, commit):
+        return (
+            self._git(path, "cat-file", "-e", f"{commit}^{{commit}}", check=False).returncode == 0
+        )
+
+    def _update(self, url, commit):
+        """Make sure the mirror of url exists and contains commit; return its path."""
+        path = self._path(url)
+        with self.lock:
+            repo_lock = self.repo_locks.setdefault(path, threading.Lock())
+        with repo_lock, open(f"{path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                subprocess.run(
+                    ["git", "clone", "--quiet", "--mirror", url, path],
+                    capture_output=True,
+                    check=True,
+                )
+            elif not self._has_commit(path, commit):
+                self._git(path, "fetch", "--quiet", "--prune", "origin")
+            if not self._has_commit(path, commit):
+                # Commits that are not on any branch can often still be fetched directly
+                self._git(path, "fetch", "--quiet", "origin", commit, check=False)
+        return path
+
+    def read_file(self, url, commit, filename):
+        """Return the content of filename at commit in the repository at url, or None."""
+        key = (url, commit, filename)
+        with self.lock:
+            if key in self.memo:
+                return self.memo[key]
+        path = self._update(url, commit)
+        result = self._git(path, "cat-file", "blob", f"{commit}:{filename}", check=False)
+        if result.returncode != 0 and not self._has_commit(path, commit):
+            raise ValueError(f"commit {commit} not found in {url}")
+        content = result.stdout.decode() if result.returncode == 0 else None
+        with self.lock:
+            self.memo[key] = content
+        return content
+
+    def close(self):
+        if self.temporary:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
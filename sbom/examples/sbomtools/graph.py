@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from .model import Package, Record, Relationship, expand
+
+DOCUMENT_ID = "SPDXRef-DOCUMENT"
+# Related elements that aren't packages of the document
+SPECIAL_ELEMENTS = {DOCUMENT_ID, "NOASSERTION", "NONE"}
+
+
+def _endpoints(rel):
+    """Return (element, type, related) of a relationship dict or sbomtools.model object."""
+    if isinstance(rel, Relationship):
+        return rel.element, rel.type, rel.related
+    if isinstance(rel, Record):
+        rel = expand(rel)
+    return rel["spdxElementId"], rel["relationshipType"], rel["relatedSpdxElement"]
+
+
+class RelationshipGraph:
+    """Index of the relationships of an SPDX document and of its packages by SPDXID.
+
+    Relationships are indexed by type in both directions, so that the elements related to an
+    element (and those relating to it) are found without scanning all relationships. Only the
+    relationships of the given types are kept if types is set.
+    """
+
+    def __init__(self, relationships=(), packages=(), types=None):
+        self.types = set(types) if types is not None else None
+        self.forward = defaultdict(lambda: defaultdict(list))
+        self.backward = defaultdict(lambda: defaultdict(list))
+        self.packages = {}
+        self.relationships = []
+        for package in packages:
+            self.add_package(package)
+        for rel in relationships:
+            self.add_relationship(rel)
+
+    def add_package(self, package):
+        spdx_id = package.id if isinstance(package, Package) else package["SPDXID"]
+        self.packages[spdx_id] = package
+
+    def add_relationship(self, rel):
+        element, rel_type, related = _endpoints(rel)
+        if self.types is not None and rel_type not in self.types:
+            return
+        self.forward[rel_type][element].append(related)
+        self.backward[rel_type][related].append(element)
+        self.relationships.append((element, rel_type, related))
+
+    def related(self, element, rel_type):
+        """Return the elements element has a rel_type relationship to, as a tuple.
+
+        A copy is returned, since the index keeps growing while relationships are added.
+        """
+        return tuple(self.forward[rel_type].get(element, ()))
+
+    def relating(self, related, rel_type):
+        """Return the elements that have a rel_type relationship to related, as a tuple."""
+        return tuple(self.backward[rel_type].get(related, ()))
+
+    def described(self):
+        """Return the SPDXIDs of the elements the document DESCRIBES."""
+        return self.related(DOCUMENT_ID, "DESCRIBES")
+
+    def reachable(self, start, rel_types, reverse=False):
+        """Return all elements transitively reachable from start over rel_types relationships.
+
+        With reverse, relationships are followed from their related element to their element,
+        e.g. for .._OF types. Elements are returned in breadth-first order, without start.
+        """
+        index = self.backward if reverse else self.forward
+        seen = {start}
+        found = []
+        queue = [start]
+        while queue:
+            next_queue = []
+            for element in queue:
+                for rel_type in rel_types:
+                    for other in index[rel_type].get(element, []):
+                        if other not in seen:
+                            seen.add(other)
+                            found.append(other)
+                            next_queue.append(other)
+            queue = next_queue
+        return found
+
+    def dangling(self):
+        """Return the relationships (as tuples) with an endpoint not in the document.
+
+        Elements of other documents ("DocumentRef-...:SPDXRef-...") aren't checked.
+        """
+        known = self.packages.keys() | SPECIAL_ELEMENTS
+        return [
+            rel
+            for rel in self.relationships
+            if any(spdx_id not in known and ":" not in spdx_id for spdx_id in (rel[0], rel[2]))
+        ]
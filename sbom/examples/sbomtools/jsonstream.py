@@ -0,0 +1,115 @@
+import json
+
+CHUNK_SIZE = 1024 * 1024
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Incremental reader of JSON values from a text stream, decoded with json's own decoder."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=CHUNK_SIZE):
+        if self.pos > CHUNK_SIZE:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        data = self.fp.read(size)
+        if not data:
+            self.eof = True
+        self.buffer += data
+        return bool(data)
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ("" at the end)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            # Grow the buffer geometrically, so that large values aren't decoded too often
+            self._fill(max(CHUNK_SIZE, len(self.buffer) - self.pos))
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == "]":
+            reader.pos += 1
+            return
+        reader.expect(",")
+
+
+def iter_object(fp, stream_keys=()):
+    """Yield the (key, value) pairs of the JSON object in the text stream fp while reading it.
+
+    Array values of keys in stream_keys are yielded as iterators over their elements, so that only
+    one element at a time is in memory; elements not consumed before the next pair is requested
+    are skipped. All other values are decoded completely, as by json.load().
+    """
+    reader = _Reader(fp)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key in stream_keys and reader.peek() == "[":
+            elements = _iter_array(reader)
+            yield key, elements
+            for _ in elements:
+                pass
+        else:
+            yield key, reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+def iter_array(fp, key, skip_keys=()):
+    """Yield the elements of the array under key in the JSON object in fp, one at a time.
+
+    Arrays under skip_keys (e.g. the packages before the relationships) are read one element at a
+    time too instead of being decoded whole, only to be thrown away.
+    """
+    for item_key, value in iter_object(fp, {key, *skip_keys}):
+        if item_key == key:
+            yield from value
+            return
+
+
+def map_array(pairs, key, function):
+    """Apply function to each element of the streamed array under key in pairs from iter_object()."""
+    for item_key, value in pairs:
+        if item_key == key:
+            value = map(function, value)
+        yield item_key, value
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# Calls whose results never change once a build is complete, and which may therefore be cached on
+# disk across runs. Not getRPMChecksums: the checksums of signed copies of RPMs appear as they are
+# written, which can be long after the build.
+IMMUTABLE_CALLS = {
+    "getBuild",
+    "getBuildType",
+    "listArchives",
+    "listBuildRPMs",
+    "getRPMHeaders",
+}
+# Calls about a single build (given as the first argument or by keyword), which are only cached on
+# disk once getBuild has shown the build to be complete: until then, they may still change.
+BUILD_CALLS = {"getBuildType": "buildInfo", "listArchives": "buildID", "listBuildRPMs": "build"}
+BUILD_STATE_COMPLETE = 1
+
+
+class CachingSession:
+    """Wrapper around a koji.ClientSession that memoizes calls and batches them with multicall.
+
+    Any hub method can be called on it like on the wrapped session. Identical calls within a run
+    are only sent to the hub once, and results of calls in IMMUTABLE_CALLS are optionally stored in
+    cache_dir for later runs. Results are shared between callers and must not be modified.
+
+    Calls in BUILD_CALLS are only cached on disk for builds that getBuild returned as complete, so
+    call getBuild first (or in the same prefetch()) for them to be cached.
+
+    Use prefetch() to send a number of calls known in advance in a single round trip.
+    """
+
+    def __init__(self, session, cache_dir=None, batch_size=500):
+        self.session = session
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.memo = {}
+        # IDs and NVRs of the builds known to be complete
+        self.complete = set()
+        self.lock = threading.Lock()
+        # koji.ClientSession is not thread-safe, so only one call goes to the hub at a time.
+        self.hub_lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            return self.call(method, *args, **kwargs)
+
+        return call
+
+    @staticmethod
+    def _key(method, args, kwargs=None):
+        return json.dumps([method, list(args), kwargs or {}], sort_keys=True, default=str)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _on_disk(self, method, args, kwargs):
+        """Whether the result of the call is (to be) cached in cache_dir."""
+        if not self.cache_dir or method not in IMMUTABLE_CALLS:
+            return False
+        if method not in BUILD_CALLS:
+            return True
+        build = args[0] if args else kwargs.get(BUILD_CALLS[method])
+        with self.lock:
+            return isinstance(build, (int, str)) and build in self.complete
+
+    def _add_complete(self, build):
+        with self.lock:
+            self.complete.update((build["id"], build["nvr"]))
+
+    def _lookup(self, method, args, kwargs, key):
+        """Return (True, result) if the call result is already known, (False, None) otherwise."""
+        with self.lock:
+            if key in self.memo:
+                return True, self.memo[key]
+        if self._on_disk(method, args, kwargs):
+            try:
+                with open(self._cache_path(key)) as fp:
+                    result = json.load(fp)
+            except FileNotFoundError:
+                return False, None
+            with self.lock:
+                self.memo[key] = result
+            if method == "getBuild":
+                # Only complete builds are stored
+                self._add_complete(result)
+            return True, result
+        return False, None
+
+    def _store(self, method, args, kwargs, key, result):
+        with self.lock:
+            self.memo[key] = result
+        # Builds that are still in progress (or failed) may change or be deleted.
+        if method == "getBuild":
+            if not result or result["state"] != BUILD_STATE_COMPLETE:
+                return
+            self._add_complete(result)
+        if not self._on_disk(method, args, kwargs):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump(result, fp, default=str)
+        os.replace(tmp_path, self._cache_path(key))
+
+    def call(self, method, *args, **kwargs):
+        key = self._key(method, args, kwargs)
+        found, result = self._lookup(method, args, kwargs, key)
+        if not found:
+            with self.hub_lock:
+                result = getattr(self.session, method)(*args, **kwargs)
+            self._store(method, args, kwargs, key, result)
+        return result
+
+    def prefetch(self, calls):
+        """Send all not yet known calls in one multicall.
+
+        calls is a list of (method, args) or (method, args, kwargs) tuples. Results are taken in
+        the order of calls, so getBuild calls should come before other calls about the same builds.
+        """
+        pending = {}
+        for method, args, *kwargs in calls:
+            kwargs = kwargs[0] if kwargs else {}
+            key = self._key(method, args, kwargs)
+            if key not in pending and not self._lookup(method, args, kwargs, key)[0]:
+                pending[key] = (method, args, kwargs)
+        if not pending:
+            return
+
+        with self.hub_lock:
+            with self.session.multicall(strict=True, batch=self.batch_size) as multicall:
+                virtual_calls = {
+                    key: getattr(multicall, method)(*args, **kwargs)
+                    for key, (method, args, kwargs) in pending.items()
+                }
+        for key, virtual_call in virtual_calls.items():
+            method, args, kwargs = pending[key]
+            self._store(method, args, kwargs, key, virtual_call.result)
@@ -0,0 +1,365 @@
+import sys
+
+# Keys of package objects held in Package slots, per format. "purls" are the purls identifying the
+# package: all purl references of an SPDX package, or the purl of a CycloneDX component.
+PACKAGE_SLOTS = {
+    "spdx": {"SPDXID": "id", "name": "name", "versionInfo": "version", "externalRefs": "purls"},
+    "cdx": {"bom-ref": "id", "name": "name", "version": "version", "purl": "purls"},
+}
+PACKAGE_LISTS = {"spdx": "packages", "cdx": "components"}
+PURL_REF_KEYS = ("referenceCategory", "referenceType", "referenceLocator")
+RELATIONSHIP_KEYS = ("spdxElementId", "relationshipType", "relatedSpdxElement")
+
+_layouts = {}
+
+
+def _layout(keys):
+    """Return a tuple of keys shared by all objects with the same keys."""
+    keys = tuple(keys)
+    return _layouts.setdefault(keys, keys)
+
+
+class Record:
+    """Compact form of a JSON object: a shared tuple of its keys and a tuple of its values."""
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+
+def compact(value):
+    """Convert a JSON value into an equivalent one using less memory, see expand()."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return Record(
+            _layout(sys.intern(key) for key in value), tuple(compact(v) for v in value.values())
+        )
+    if isinstance(value, list):
+        return tuple(compact(v) for v in value)
+    return value
+
+
+def expand(value):
+    """Convert a value made by compact() back into plain dicts and lists."""
+    if isinstance(value, Record):
+        return dict(zip(value.keys, map(expand, value.values)))
+    if isinstance(value, tuple):
+        return [expand(v) for v in value]
+    return value
+
+
+class Package:
+    """An SPDX package or CycloneDX component.
+
+    The fields used by the transforms are kept in slots, everything else in compact form, so that
+    the original object can be reproduced exactly (including the order of its keys).
+    """
+
+    __slots__ = ("format", "id", "name", "version", "purls", "layout", "other")
+
+    def __init__(self, format, layout, other, id=None, name=None, version=None, purls=()):
+        self.format = format
+        self.layout = layout
+        self.other = other
+        self.id = id
+        self.name = name
+        self.version = version
+        self.purls = purls
+
+    @classmethod
+    def decode(cls, format, obj):
+        slots = PACKAGE_SLOTS[format]
+        package = cls(format, _layout(sys.intern(key) for key in obj), ())
+        other = []
+        for key, value in obj.items():
+            slot = slots.get(key)
+            if slot == "purls":
+                value = _decode_purls(format, value)
+                if value is None:
+                    # Not just purls, so keep it as is
+                    package.purls = None
+                    other.append(compact(obj[key]))
+                    continue
+            if slot:
+                setattr(package, slot, compact(value))
+            else:
+                other.append(compact(value))
+        package.other = tuple(other)
+        return package
+
+    def encode(self):
+        slots = PACKAGE_SLOTS[self.format]
+        other = iter(self.other)
+        obj = {}
+        for key in self.layout:
+            slot = slots.get(key)
+            if slot == "purls" and self.purls is not None:
+                obj[key] = _encode_purls(self.format, self.purls)
+            elif slot and slot != "purls":
+                obj[key] = getattr(self, slot)
+            else:
+                obj[key] = expand(next(other))
+        return obj
+
+    def _in_other(self, key):
+        slot = PACKAGE_SLOTS[self.format].get(key)
+        return slot is None or (slot == "purls" and self.purls is None)
+
+    def _other_index(self, key):
+        index = 0
+        for layout_key in self.layout:
+            if layout_key == key:
+                return index
+            if self._in_other(layout_key):
+                index += 1
+        return None
+
+    def get(self, key, default=None):
+        """Return the value of a field as plain dicts and lists, like dict.get()."""
+        if key not in self.layout:
+            return default
+        slot = PACKAGE_SLOTS[self.format].get(key)
+        if not self._in_other(key):
+            return (
+                _encode_purls(self.format, self.purls) if slot == "purls" else getattr(self, slot)
+            )
+        return expand(self.other[self._other_index(key)])
+
+    def set(self, key, value):
+        """Set a field; new fields are added at the end like in a dict."""
+        slot = PACKAGE_SLOTS[self.format].get(key)
+        if slot is not None:
+            purls = _decode_purls(self.format, value) if slot == "purls" else None
+            if purls is not None:
+                self.set_purls(purls)
+            else:
+                # Rare, so simply start over
+                obj = self.encode()
+                obj[key] = value
+                self._replace(obj)
+            return
+        index = self._other_index(key)
+        if index is None:
+            self.layout = _layout((*self.layout, sys.intern(key)))
+            self.other = (*self.other, compact(value))
+        else:
+            self.other = (*self.other[:index], compact(value), *self.other[index + 1 :])
+
+    def delete(self, key):
+        """Remove a field if it is present."""
+        if key not in self.layout:
+            return
+        if not self._in_other(key):
+            obj = self.encode()
+            del obj[key]
+            self._replace(obj)
+            return
+        index = self._other_index(key)
+        self.layout = _layout(layout_key for layout_key in self.layout if layout_key != key)
+        self.other = (*self.other[:index], *self.other[index + 1 :])
+
+    def _replace(self, obj):
+        new = Package.decode(self.format, obj)
+        for slot in self.__slots__:
+            setattr(self, slot, getattr(new, slot))
+
+    def set_purls(self, purls):
+        """Replace the purls identifying the package (all external references in SPDX)."""
+        key = "purl" if self.format == "cdx" else "externalRefs"
+        if key not in self.layout:
+            self.layout = _layout((*self.layout, key))
+        elif self.purls is None:
+            # The field was stored as is so far
+            index = self._other_index(key)
+            self.other = (*self.other[:index], *self.other[index + 1 :])
+        self.purls = tuple(sys.intern(purl) for purl in purls)
+
+
+def _decode_purls(format, value):
+    if format == "cdx":
+        return (sys.intern(value),) if isinstance(value, str) else None
+    purls = []
+    for ref in value:
+        if tuple(ref) != PURL_REF_KEYS or ref["referenceCategory"] != "PACKAGE-MANAGER":
+            return None
+        if ref["referenceType"] != "purl":
+            return None
+        purls.append(sys.intern(ref["referenceLocator"]))
+    return tuple(purls)
+
+
+def _encode_purls(format, purls):
+    if format == "cdx":
+        return purls[0]
+    return [
+        {"referenceCategory": "PACKAGE-MANAGER", "referenceType": "purl", "referenceLocator": purl}
+        for purl in purls
+    ]
+
+
+class Relationship:
+    """An SPDX relationship."""
+
+    __slots__ = ("element", "type", "related")
+
+    def __init__(self, element, type, related):
+        self.element = element
+        self.type = type
+        self.related = related
+
+    @classmethod
+    def decode(cls, obj):
+        """Return a Relationship, or a Record for relationships with other fields."""
+        if tuple(obj) != RELATIONSHIP_KEYS:
+            return compact(obj)
+        return cls(*(sys.intern(obj[key]) for key in RELATIONSHIP_KEYS))
+
+    def encode(self):
+        return {
+            "spdxElementId": self.element,
+            "relationshipType": self.type,
+            "relatedSpdxElement": self.related,
+        }
+
+
+def get_format(doc):
+    return "cdx" if "bomFormat" in doc else "spdx"
+
+
+class Document:
+    """An SPDX or CycloneDX document whose packages and relationships are held compactly."""
+
+    __slots__ = ("format", "fields")
+
+    def __init__(self, format, fields):
+        self.format = format
+        self.fields = fields
+
+    @property
+    def packages(self):
+        return self.fields.get(PACKAGE_LISTS[self.format], [])
+
+    @property
+    def relationships(self):
+        return self.fields.get("relationships", [])
+
+    @classmethod
+    def decode(cls, doc):
+        format = get_format(doc)
+        fields = dict(doc)
+        package_list = PACKAGE_LISTS[format]
+        if package_list in fields:
+            fields[package_list] = [Package.decode(format, obj) for obj in fields[package_list]]
+        if format == "spdx" and "relationships" in fields:
+            fields["relationships"] = [Relationship.decode(obj) for obj in fields["relationships"]]
+        return cls(format, fields)
+
+    def encode(self):
+        """Return the document as a dict for writer.write_json(), encoding packages lazily."""
+        doc = dict(self.fields)
+        package_list = PACKAGE_LISTS[self.format]
+        if package_list in doc:
+            doc[package_list] = (package.encode() for package in doc[package_list])
+        if "relationships" in doc and self.format == "spdx":
+            doc["relationships"] = (
+                expand(rel) if isinstance(rel, Record) else rel.encode()
+                for rel in doc["relationships"]
+            )
+        return doc
+
+
+def first_purl(package):
+    """Return the first purl of package, or None."""
+    if package.purls is not None:
+        return next(iter(package.purls), None)
+    return next(
+        (
+            ref["referenceLocator"]
+            for ref in package.get("externalRefs", [])
+            if ref["referenceType"] == "purl"
+        ),
+        None,
+    )
+
+
+class Component:
+    """A package of an SBOM apart from its format.
+
+    Holds the SPDX package and the CycloneDX component describing the same package (those of them
+    there are), so that transforms compute what they add once and have it written in each format.
+    """
+
+    __slots__ = ("purl", "packages")
+
+    def __init__(self, packages):
+        self.packages = {package.format: package for package in packages}
+        self.purl = first_purl(next(iter(self.packages.values())))
+
+    def set_identities(self, purls):
+        """Set the purls the package is known by, like the purls of the repositories it is in.
+
+        SPDX packages get them as purl references, sorted; CycloneDX components keep their purl
+        and list them as evidence of their identity, in the order given.
+        """
+        for package in self.packages.values():
+            if package.format == "spdx":
+                package.set_purls(sorted(purls))
+            else:
+                identity = [{"field": "purl", "concludedValue": purl} for purl in purls]
+                package.set("evidence", {"identity": identity})
+
+
+def match_components(documents):
+    """Return the Components of the packages of documents, the same SBOM in different formats.
+
+    The n-th packages with the same first purl in each document are one Component; packages
+    without a purl are Components of their own. For each document, the Components of its packages
+    are returned in the order of the packages.
+    """
+    groups = {}
+    keys = []
+    for index, document in enumerate(documents):
+        seen = {}
+        document_keys = []
+        for package in document.packages:
+            purl = first_purl(package)
+            if purl is None:
+                key = (index, len(document_keys))
+            else:
+                key = (purl, seen.get(purl, 0))
+                seen[purl] = key[1] + 1
+            groups.setdefault(key, []).append(package)
+            document_keys.append(key)
+        keys.append(document_keys)
+    components = {key: Component(packages) for key, packages in groups.items()}
+    return [[components[key] for key in document_keys] for document_keys in keys]
+
+
+def spdx_to_cdx(obj):
+    """Return the CycloneDX component of an SPDX package of an RPM (as written by from-koji.py).
+
+    The sigmd5 and sha256header annotations of the package become properties of the component.
+    """
+    purl = obj["externalRefs"][0]["referenceLocator"]
+    component = {
+        "bom-ref": purl,
+        "type": "library",
+        "name": obj["name"],
+        "version": obj["versionInfo"],
+        "purl": purl,
+        "hashes": [{"alg": "SHA-256", "content": obj["checksums"][0]["checksumValue"]}],
+    }
+
+    properties = []
+    for annotation in obj.get("annotations", []):
+        comment = annotation["comment"]
+        for prefix in ("sigmd5", "sha256header"):
+            if comment.startswith(prefix):
+                value = comment[(len(prefix) + 2) :]
+                properties.append({"name": f"package:rpm:{prefix}", "value": value})
+    if properties:
+        component["properties"] = properties
+    return component
@@ -0,0 +1,158 @@
+import functools
+import string
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+from urllib.parse import quote, unquote
+
+from packageurl import PackageURL
+
+# Purls of these forms are parsed without packageurl-python, if they are simple enough
+FAST_PREFIXES = ("pkg:rpm/redhat/", "pkg:oci/")
+QUALIFIER_KEY_CHARS = frozenset(string.ascii_lowercase + string.digits + ".-_")
+# Types whose names and versions packageurl-python lowercases
+LOWERCASE_TYPES = {"oci"}
+CACHE_SIZE = 64 * 1024
+
+
+class Purl(namedtuple("Purl", ("type", "namespace", "name", "version", "qualifiers", "subpath"))):
+    """A parsed package URL, with the same (decoded) fields as packageurl.PackageURL.
+
+    Instances are shared between all users of parse_purl() and are immutable; qualifiers is a
+    read-only mapping. Use to_string() to get variants with other qualifiers.
+    """
+
+    __slots__ = ()
+
+    def to_string(self, qualifiers=None, escape_digest=False):
+        """Return the purl as a string, encoded exactly like PackageURL.to_string() does.
+
+        qualifiers are added to or replace the purl's own; a value of None removes one. With
+        escape_digest, the colon after "sha256" is percent-encoded, which packageurl-python
+        doesn't do (https://github.com/package-url/packageurl-python/issues/152).
+        """
+        merged = self.qualifiers
+        if qualifiers:
+            merged = dict(merged)
+            for key, value in qualifiers.items():
+                if value is None:
+                    merged.pop(key, None)
+                else:
+                    merged[key] = value
+        purl = _format_base(self.type, self.namespace, self.name, self.version)
+        encoded_qualifiers = "&".join(
+            f"{key}={_quote(value)}"
+            for key, value in sorted(merged.items())
+            if value and value.strip()
+        )
+        if encoded_qualifiers:
+            purl = f"{purl}?{encoded_qualifiers}"
+        if self.subpath:
+            purl = f"{purl}#{_format_subpath(self.subpath)}"
+        if escape_digest:
+            purl = purl.replace("sha256:", "sha256%3A")
+        return purl
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _quote(value):
+    return quote(value).replace("%3A", ":")
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _format_base(type_, namespace, name, version):
+    name = _quote(name).strip().strip("/")
+    if type_ in LOWERCASE_TYPES:
+        name = name.lower()
+    purl = f"pkg:{type_}/"
+    if namespace:
+        purl += "/".join(_quote(segment) for segment in namespace.split("/") if segment.strip())
+        purl += "/"
+    purl += name
+    if version:
+        version = _quote(version.strip())
+        if type_ in LOWERCASE_TYPES:
+            version = version.lower()
+        purl += f"@{version}"
+    return purl
+
+
+def _format_subpath(subpath):
+    return "/".join(
+        _quote(segment)
+        for segment in subpath.split("/")
+        if segment.strip() and segment not in (".", "..")
+    )
+
+
+def _parse_fast(purl):
+    """Parse a simple pkg:rpm/redhat/ or pkg:oci/ purl; return None if it needs the full parser."""
+    if not purl.startswith(FAST_PREFIXES) or "#" in purl or not purl.isprintable() or " " in purl:
+        return None
+
+    type_, _, remainder = purl[4:].partition("/")
+    namespace = None
+    if type_ == "rpm":
+        namespace, _, remainder = remainder.partition("/")
+    remainder, _, qualifiers_str = remainder.partition("?")
+    name, sep, version = remainder.rpartition("@")
+    if not sep:
+        name, version = version, None
+    if not name or any(c in name for c in "/:%") or (version is not None and "/" in version):
+        return None
+
+    if version:
+        version = unquote(version) if "%" in version else version
+        if version != version.strip():
+            return None
+    version = version or None
+    if type_ in LOWERCASE_TYPES:
+        name = name.lower()
+        version = version and version.lower()
+
+    qualifiers = {}
+    if qualifiers_str:
+        for pair in qualifiers_str.split("&"):
+            key, sep, value = pair.partition("=")
+            if (
+                not sep
+                or not key
+                or key in qualifiers
+                or key[0] in string.digits
+                or not QUALIFIER_KEY_CHARS.issuperset(key)
+            ):
+                return None
+            value = unquote(value) if "%" in value else value
+            if not value.strip():
+                return None
+            qualifiers[sys.intern(key)] = sys.intern(value)
+
+    return Purl(
+        sys.intern(type_),
+        namespace and sys.intern(namespace),
+        sys.intern(name),
+        version and sys.intern(version),
+        MappingProxyType(dict(sorted(qualifiers.items()))),
+        None,
+    )
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_purl(purl):
+    """Parse a purl string like PackageURL.from_string(), memoizing the result.
+
+    Red Hat RPM and OCI purls as found in the example SBOMs are parsed by a specialized parser,
+    anything else by packageurl-python. Raises ValueError for invalid purls.
+    """
+    parsed = _parse_fast(purl)
+    if parsed is None:
+        package_url = PackageURL.from_string(purl)
+        parsed = Purl(
+            package_url.type,
+            package_url.namespace,
+            package_url.name,
+            package_url.version,
+            MappingProxyType(dict(package_url.qualifiers)),
+            package_url.subpath,
+        )
+    return parsed
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CATALOG_URL = "https://catalog.redhat.com/api/containers/v1/"
+PAGE_SIZE = 100
+MAX_WORKERS = 8
+TIMEOUT = 60
+# Transient errors are retried with exponential backoff (0.5s, 1s, 2s, ...), honouring any
+# Retry-After header sent with 429 and 503 responses.
+RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods={"GET"},
+)
+
+
+class PyxisClient:
+    """Client for the container catalog (Pyxis) API.
+
+    All requests go through one requests.Session, so connections are kept alive and reused (up to
+    max_workers of them, the number of requests made concurrently), and failed requests are
+    retried. Paged results are fetched page by page as they are consumed.
+    """
+
+    def __init__(self, base_url=CATALOG_URL, max_workers=MAX_WORKERS, page_size=PAGE_SIZE):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_workers, max_retries=RETRY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, params=None):
+        response = self.session.get(self.base_url + path, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_pages(self, path, params=None):
+        """Yield the items of all pages of a paged response, fetching pages as needed."""
+        page = 0
+        while True:
+            result = self.get(path, {**(params or {}), "page_size": self.page_size, "page": page})
+            yield from result["data"]
+            page += 1
+            if len(result["data"]) < self.page_size or page * self.page_size >= result["total"]:
+                return
+
+    def get_images(self, image_nvr):
+        """Return the images (one per architecture) of a container image build."""
+        return sorted(self.iter_pages(f"images/nvr/{image_nvr}"), key=lambda image: image["_id"])
+
+    def get_rpms(self, image_id):
+        """Return the RPMs installed in an image."""
+        rpms = self.get(f"images/id/{image_id}/rpm-manifest")["rpms"]
+        return sorted(rpms, key=lambda rpm: rpm["nvra"])
+
+    def get_rpms_for_images(self, image_ids):
+        """Return the RPMs of several images, fetched concurrently, as a dict by image ID."""
+        image_ids = list(image_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(zip(image_ids, pool.map(self.get_rpms, image_ids)))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from .fakekoji import FakeMultiCall
+from .gitmirror import GitMirror
+from .pyxis import PyxisClient
+
+
+class ReplayError(LookupError):
+    """Raised for requests that weren't recorded."""
+
+
+def request_key(*parts):
+    return json.dumps(list(parts), sort_keys=True, default=str)
+
+
+class FixtureStore:
+    """Directory of recorded responses of koji, the container catalog and git.
+
+    Each response is a JSON file in a directory per service, named after a hash of the request,
+    so that recordings can be extended by later runs and replayed in any order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, service, key):
+        return os.path.join(self.path, service, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def save(self, service, key, result):
+        path = self._path(service, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"request": json.loads(key), "result": result}, fp, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def load(self, service, key):
+        try:
+            with open(self._path(service, key)) as fp:
+                return json.load(fp)["result"]
+        except FileNotFoundError:
+            raise ReplayError(f"{service} request not recorded: {key}") from None
+
+
+class _RecordingMultiCall:
+    def __init__(self, multicall, store):
+        self.multicall = multicall
+        self.store = store
+        self.calls = []
+
+    def __enter__(self):
+        self.inner = self.multicall.__enter__()
+        return self
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            virtual_call = getattr(self.inner, method)(*args, **kwargs)
+            self.calls.append((request_key(method, args, kwargs), virtual_call))
+            return virtual_call
+
+        return call
+
+    def __exit__(self, exc_type, exc, tb):
+        result = self.multicall.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            for key, virtual_call in self.calls:
+                self.store.save("koji", key, virtual_call.result)
+        return result
+
+
+class RecordingKojiSession:
+    """Wrapper around a koji.ClientSession saving the results of all calls to a FixtureStore."""
+
+    def __init__(self, session, store):
+        self.session = session
+        self.store = store
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            result = getattr(self.session, method)(*args, **kwargs)
+            self.store.save("koji", request_key(method, args, kwargs), result)
+            return result
+
+        return call
+
+    def multicall(self, **kwargs):
+        return _RecordingMultiCall(self.session.multicall(**kwargs), self.store)
+
+
+class ReplayKojiSession:
+    """Offline stand-in for koji.ClientSession answering calls from a FixtureStore.
+
+    Like sbomtools.fakekoji.FakeKojiSession, it supports multicall and counts round trips.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.round_trips = 0
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            self.round_trips += 1
+            return self.dispatch(method, args, kwargs)
+
+        return call
+
+    def dispatch(self, method, args, kwargs):
+        return self.store.load("koji", request_key(method, args, kwargs))
+
+    def multicall(self, strict=False, batch=None):
+        return FakeMultiCall(self, batch)
+
+
+class RecordingPyxisClient(PyxisClient):
+    """PyxisClient saving all responses to a FixtureStore."""
+
+    def __init__(self, store, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    def get(self, path, params=None):
+        result = super().get(path, params)
+        self.store.save("pyxis", request_key(path, params or {}), result)
+        return result
+
+
+class ReplayPyxisClient(PyxisClient):
+    """PyxisClient answering requests from a FixtureStore instead of the network."""
+
+    def __init__(self, store, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    def get(self, path, params=None):
+        return self.store.load("pyxis", request_key(path, params or {}))
+
+
+class RecordingGitMirror(GitMirror):
+    """GitMirror saving the files read to a FixtureStore."""
+
+    def __init__(self, store, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    def read_file(self, url, commit, filename):
+        content = super().read_file(url, commit, filename)
+        self.store.save("git", request_key(url, commit, filename), content)
+        return content
+
+
+class ReplayGitMirror:
+    """Stand-in for GitMirror reading files from a FixtureStore instead of repositories."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def read_file(self, url, commit, filename):
+        return self.store.load("git", request_key(url, commit, filename))
+
+    def close(self):
+        pass
@@ -0,0 +1,334 @@
+import json
+
+from .graph import RelationshipGraph
+from .jsonstream import iter_object
+from .model import PACKAGE_LISTS, Component, Document, Package, first_purl, match_components
+from .purl import parse_purl
+from .writer import StreamedObject, write_json
+
+SBOM_FORMATS = {".spdx.json": "spdx", ".cdx.json": "cdx"}
+
+
+def get_sbom_format(path):
+    """Return the format of an SBOM file by its suffix, or None."""
+    return next((fmt for suffix, fmt in SBOM_FORMATS.items() if path.endswith(suffix)), None)
+
+
+def parse_rpm_purl(purl_str):
+    """Return the parsed purl of a Red Hat RPM, or None for other purls (and None)."""
+    if purl_str is None or (not purl_str.startswith("pkg:rpm/redhat")):
+        return None
+    return parse_purl(purl_str)
+
+
+def get_rpm_purl(package):
+    """Return the parsed first purl of a Red Hat RPM package, or None for other packages."""
+    return parse_rpm_purl(first_purl(package))
+
+
+def _map_purl_refs(package, function):
+    """Replace each purl of package by function(purl), dropping duplicates and None."""
+    if package.purls is not None:
+        purls = package.purls
+    elif package.format == "spdx":
+        refs = package.get("externalRefs")
+        new_refs = []
+        for ref in refs:
+            if ref["referenceType"] == "purl":
+                ref["referenceLocator"] = function(ref["referenceLocator"])
+                if ref["referenceLocator"] is None or ref in new_refs:
+                    continue
+            new_refs.append(ref)
+        package.set("externalRefs", new_refs)
+        return
+    else:
+        return
+    new_purls = []
+    for purl in map(function, purls):
+        if purl is not None and purl not in new_purls:
+            new_purls.append(purl)
+    if new_purls != list(purls):
+        package.set_purls(new_purls)
+
+
+class Stage:
+    """One transform of a Pipeline, applied to each package of an SBOM.
+
+    Stages that need to see the whole document before transforming it (e.g. to collect the
+    architectures of all RPMs) set scans, so that scan_package() and scan_relationship() are
+    called for all packages and relationships of the input first. transform_field() is called for
+    the other top-level fields of the document.
+
+    Packages are transformed as model.Components, which hold the package in each format of the SBOM
+    being transformed together. By default transform_package() is called for each of them; stages
+    that change them alike override transform_component() to do the work once.
+    """
+
+    name = None
+    scans = False
+
+    def scan_package(self, package):
+        pass
+
+    def scan_relationship(self, rel):
+        pass
+
+    def transform_component(self, component):
+        for fmt, package in component.packages.items():
+            component.packages[fmt] = self.transform_package(package)
+
+    def transform_package(self, package):
+        return package
+
+    def transform_field(self, key, value):
+        return value
+
+
+class StripRelease(Stage):
+    """Remove the tag and repository from the OCI purls of the images an SBOM describes."""
+
+    name = "strip-release"
+    scans = True
+
+    def __init__(self):
+        # Only these are needed, so that the relationships needn't all be kept in memory
+        self.graph = RelationshipGraph(types=("DESCRIBES", "VARIANT_OF"))
+        self._built = None
+
+    def scan_relationship(self, rel):
+        self.graph.add_relationship(rel)
+
+    @property
+    def built(self):
+        """The described packages and any packages that are VARIANT_OF them."""
+        if self._built is None:
+            self._built = set(self.graph.described())
+            for spdx_id in list(self._built):
+                self._built.update(self.graph.relating(spdx_id, "VARIANT_OF"))
+        return self._built
+
+    def transform_package(self, package):
+        if package.format == "spdx" and package.id in self.built:
+            _map_purl_refs(package, self._strip)
+        return package
+
+    @staticmethod
+    def _strip(purl_str):
+        purl = parse_purl(purl_str)
+        if purl.type != "oci":
+            return purl_str
+        return purl.to_string({"tag": None, "repository_url": None}, escape_digest=True)
+
+
+class AddRepositoryIDs(Stage):
+    """Add the purls of the repositories RPMs are released to, see sbomtools.repoids.
+
+    SPDX packages get one purl reference per repository (sorted), CycloneDX components list them
+    as evidence of their identity (in the order of the repository ID templates).
+    """
+
+    name = "add-repository-ids"
+    scans = True
+
+    def __init__(self, repo_ids):
+        # Components are listed in the order of the repository ID templates in CycloneDX
+        self.repo_ids = repo_ids.sorted()
+        self.all_arches = set()
+
+    def scan_package(self, package):
+        purl = get_rpm_purl(package)
+        if purl is not None and purl.qualifiers["arch"] != "src":
+            self.all_arches.add(purl.qualifiers["arch"])
+
+    def transform_component(self, component):
+        purl = parse_rpm_purl(component.purl)
+        if purl is None:
+            return
+        if purl.qualifiers["arch"] == "src":
+            repository_ids = self.repo_ids.for_srpm(sorted(self.all_arches))
+        else:
+            repository_ids = self.repo_ids.for_rpm(purl.name, purl.qualifiers["arch"])
+        component.set_identities(
+            [purl.to_string({"repository_id": repo_id}) for repo_id in repository_ids]
+        )
+
+
+class StripRepositoryIDs(Stage):
+    """Undo AddRepositoryIDs: drop the repository_id qualifier from RPM purls."""
+
+    name = "strip-repository-ids"
+
+    def transform_package(self, package):
+        if get_rpm_purl(package) is None:
+            return package
+        if package.format == "cdx":
+            package.delete("evidence")
+        _map_purl_refs(package, self._strip)
+        return package
+
+    @staticmethod
+    def _strip(purl_str):
+        if not purl_str.startswith("pkg:rpm/"):
+            return purl_str
+        return parse_purl(purl_str).to_string({"repository_id": None})
+
+
+class AddCPEs(Stage):
+    """Add CPE IDs to the described package (SPDX) or the metadata component (CycloneDX)."""
+
+    name = "add-cpes"
+    scans = True
+
+    def __init__(self, cpe_ids):
+        self.cpe_ids = list(cpe_ids)
+        self.graph = RelationshipGraph(types=("DESCRIBES",))
+
+    def scan_relationship(self, rel):
+        self.graph.add_relationship(rel)
+
+    def transform_package(self, package):
+        if package.format == "spdx" and package.id in self.graph.described():
+            refs = package.get("externalRefs", [])
+            refs.extend(
+                {
+                    "referenceCategory": "SECURITY",
+                    "referenceType": "cpe22Type",
+                    "referenceLocator": cpe,
+                }
+                for cpe in self.cpe_ids
+            )
+            package.set("externalRefs", refs)
+        return package
+
+    def transform_field(self, key, value):
+        if key == "metadata" and "component" in value:
+            # CycloneDX components have a single CPE
+            if len(self.cpe_ids) > 1:
+                raise ValueError("CycloneDX components can only have one CPE")
+            value["component"]["cpe"] = self.cpe_ids[0]
+        return value
+
+
+class SortRefs(Stage):
+    """Sort the external references of SPDX packages and the identities of CycloneDX components."""
+
+    name = "sort-refs"
+
+    def transform_package(self, package):
+        if package.format == "spdx":
+            if package.purls is not None:
+                if list(package.purls) != sorted(package.purls):
+                    package.set_purls(sorted(package.purls))
+            else:
+                refs = package.get("externalRefs")
+                refs.sort(
+                    key=lambda ref: (
+                        ref["referenceCategory"],
+                        ref["referenceType"],
+                        ref["referenceLocator"],
+                    )
+                )
+                package.set("externalRefs", refs)
+        else:
+            evidence = package.get("evidence")
+            if evidence and "identity" in evidence:
+                evidence["identity"].sort(key=lambda identity: identity.get("concludedValue", ""))
+                package.set("evidence", evidence)
+        return package
+
+
+STAGES = {stage.name: stage for stage in Stage.__subclasses__()}
+
+
+class Pipeline:
+    """Apply stages to an SBOM, parsing it once (twice with scanning stages in stream mode) and
+    writing it once."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def _transform(self, component):
+        for stage in self.stages:
+            stage.transform_component(component)
+        return component
+
+    def _transform_field(self, key, value):
+        for stage in self.stages:
+            value = stage.transform_field(key, value)
+        return value
+
+    def _scan(self, packages, relationships):
+        scanning = [stage for stage in self.stages if stage.scans]
+        if not scanning:
+            return
+        for package in packages:
+            for stage in scanning:
+                stage.scan_package(package)
+        for rel in relationships:
+            for stage in scanning:
+                stage.scan_relationship(rel)
+
+    def run(self, sbom_file, output, stream=False):
+        """Transform sbom_file and write the result to output.
+
+        With stream, the SBOM is read one package at a time instead of loading it whole.
+        """
+        self.run_all([(sbom_file, output)], stream)
+
+    def run_all(self, files, stream=False):
+        """Transform the same SBOM in different formats, given as (sbom_file, output) pairs.
+
+        Scanning stages see all of them first. The packages of the documents are matched (see
+        model.match_components()) and each is transformed once for all formats; with stream, the
+        files are transformed one package at a time and so on their own.
+        """
+        if not stream:
+            documents = []
+            for sbom_file, _ in files:
+                with open(sbom_file) as fp:
+                    documents.append(Document.decode(json.load(fp)))
+            for document in documents:
+                self._scan(document.packages, document.relationships)
+            layouts = match_components(documents)
+            components = {id(component): component for layout in layouts for component in layout}
+            for component in components.values():
+                self._transform(component)
+            for document, layout, (_, output) in zip(documents, layouts, files):
+                list_key = PACKAGE_LISTS[document.format]
+                for key, value in document.fields.items():
+                    if key == list_key:
+                        document.fields[key] = [
+                            component.packages[document.format] for component in layout
+                        ]
+                    elif key != "relationships":
+                        document.fields[key] = self._transform_field(key, value)
+                write_json(output, document.encode())
+            return
+
+        if any(stage.scans for stage in self.stages):
+            for sbom_file, _ in files:
+                fmt = get_sbom_format(sbom_file)
+                list_key = PACKAGE_LISTS[fmt]
+                with open(sbom_file) as fp:
+                    for key, value in iter_object(fp, {list_key, "relationships"}):
+                        if key == list_key:
+                            self._scan((Package.decode(fmt, obj) for obj in value), ())
+                        elif key == "relationships":
+                            self._scan((), value)
+        for sbom_file, output in files:
+            fmt = get_sbom_format(sbom_file)
+            with open(sbom_file) as fp:
+                pairs = iter_object(fp, {PACKAGE_LISTS[fmt], "relationships"})
+                write_json(output, StreamedObject(self._transform_pairs(fmt, pairs)))
+
+    def _transform_pairs(self, fmt, pairs):
+        list_key = PACKAGE_LISTS[fmt]
+        for key, value in pairs:
+            if key == list_key:
+                value = (
+                    self._transform(Component([Package.decode(fmt, obj)])).packages[fmt].encode()
+                    for obj in value
+                )
+            elif key != "relationships":
+                value = self._transform_field(key, value)
+            yield key, value
@@ -0,0 +1,154 @@
+import functools
+import itertools
+import json
+import os
+import pathlib
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repository_ids (
+    nvr TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    binary TEXT NOT NULL,
+    debug TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (nvr, position)
+) WITHOUT ROWID;
+"""
+IMPORT_BATCH_SIZE = 10000
+
+
+@functools.lru_cache(maxsize=64 * 1024)
+def format_repo_id(template, arch):
+    return template.format(arch=arch)
+
+
+def repo_id_variants(template):
+    """Return the binary, debuginfo and source repository ID templates for a template."""
+    return (
+        template,
+        template.replace("-rpms", "-debug-rpms"),
+        template.removesuffix("-rpms") + "-source-rpms",
+    )
+
+
+class RepoIDs:
+    """Repository ID templates (with an {arch} placeholder) a build is released to."""
+
+    __slots__ = ("binary", "debug", "source")
+
+    def __init__(self, rows):
+        self.binary, self.debug, self.source = (tuple(column) for column in zip(*rows))
+
+    def sorted(self):
+        """Return the same repository IDs, in the order of their binary templates."""
+        return RepoIDs(sorted(zip(self.binary, self.debug, self.source)))
+
+    def for_rpm(self, name, arch):
+        """Return the repository IDs of a binary RPM."""
+        if name.endswith("-debugsource"):
+            templates = self.source
+        elif name.endswith("-debuginfo"):
+            templates = self.debug
+        else:
+            templates = self.binary
+        return [format_repo_id(template, arch) for template in templates]
+
+    def for_srpm(self, arches):
+        """Return the repository IDs of the SRPM, for each template and each of arches."""
+        return [format_repo_id(template, arch) for template in self.source for arch in arches]
+
+
+class RepoIDStore:
+    """SQLite-backed mapping of build NVRs to the repository IDs they are released to.
+
+    The database is only opened on the first lookup and rows are read per NVR, so the size of the
+    mapping doesn't matter for startup. The debuginfo and source variants of each repository ID
+    are computed once on import.
+
+    With readonly, the database must exist already (so that a mistyped path isn't silently
+    created as an empty database) and can't be imported into.
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._db = None
+        self._cache = {}
+
+    @property
+    def db(self):
+        if self._db is None:
+            if self.readonly:
+                uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+                self._db = sqlite3.connect(uri, uri=True)
+            else:
+                self._db = sqlite3.connect(self.path)
+                self._db.executescript(SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get(self, nvr):
+        """Return the RepoIDs for nvr, or None if it isn't mapped."""
+        if nvr not in self._cache:
+            rows = self.db.execute(
+                "SELECT binary, debug, source FROM repository_ids WHERE nvr = ? ORDER BY position",
+                (nvr,),
+            ).fetchall()
+            self._cache[nvr] = RepoIDs(rows) if rows else None
+        return self._cache[nvr]
+
+    def import_mapping(self, mapping):
+        """Add or replace mappings from an iterable of (nvr, list of templates) pairs."""
+        mapping = iter(mapping)
+        with self.db:
+            while batch := list(itertools.islice(mapping, IMPORT_BATCH_SIZE)):
+                self.db.executemany(
+                    "DELETE FROM repository_ids WHERE nvr = ?", [(nvr,) for nvr, _ in batch]
+                )
+                self.db.executemany(
+                    "INSERT INTO repository_ids VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (nvr, position, *repo_id_variants(template))
+                        for nvr, templates in batch
+                        for position, template in enumerate(templates)
+                    ],
+                )
+        self._cache.clear()
+
+    def import_file(self, path):
+        """Import a JSON object mapping NVRs to lists of templates, or lines of such items.
+
+        Lines have the form "<nvr> <template> [<template> ...]", which lets huge mappings be
+        imported without reading them into memory first. Lines starting with "#" are comments.
+        """
+        with open(path) as fp:
+            if path.endswith(".json"):
+                self.import_mapping(json.load(fp).items())
+            else:
+                self.import_mapping(
+                    (fields[0], fields[1:])
+                    for fields in map(str.split, fp)
+                    if fields and not fields[0].startswith("#")
+                )
+
+
+@functools.cache
+def open_repo_ids(path):
+    """Return a RepoIDStore for an SQLite database (opened read-only) or a JSON or text mapping
+    (imported into memory).
+
+    Raises FileNotFoundError if path doesn't exist. Stores are opened once per process, so this
+    can be used from worker processes.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"repository ID mapping {path} not found")
+    if path.endswith((".json", ".txt")):
+        store = RepoIDStore(":memory:")
+        store.import_file(path)
+        return store
+    return RepoIDStore(path, readonly=True)
@@ -0,0 +1,170 @@
+import bz2
+import gzip
+import hashlib
+import lzma
+import struct
+from contextlib import contextmanager
+
+# See https://rpm-software-management.github.io/rpm/manual/format_v4.html for the file layout:
+# a 96-byte lead, followed by the signature header (padded to 8 bytes), the main header and the
+# (compressed) cpio payload.
+LEAD_SIZE = 96
+HEADER_MAGIC = b"\x8e\xad\xe8\x01"
+HEADER_INTRO = struct.Struct(">4s4xII")
+INDEX_ENTRY = struct.Struct(">iiii")
+
+# Header entry data types
+RPM_INT8_TYPE = 2
+RPM_INT16_TYPE = 3
+RPM_INT32_TYPE = 4
+RPM_INT64_TYPE = 5
+RPM_STRING_TYPE = 6
+RPM_BIN_TYPE = 7
+RPM_STRING_ARRAY_TYPE = 8
+RPM_I18NSTRING_TYPE = 9
+
+INT_FORMATS = {
+    RPM_INT8_TYPE: "B",
+    RPM_INT16_TYPE: "H",
+    RPM_INT32_TYPE: "I",
+    RPM_INT64_TYPE: "Q",
+}
+
+# Tags read from the signature header
+SIGNATURE_TAGS = {
+    273: "sha256header",  # RPMSIGTAG_SHA256
+    1004: "sigmd5",  # RPMSIGTAG_MD5
+}
+
+# Tags read from the main header
+HEADER_TAGS = {
+    1000: "name",
+    1001: "version",
+    1002: "release",
+    1003: "epoch",
+    1014: "license",
+    1022: "arch",
+    1044: "sourcerpm",
+    1125: "payloadcompressor",
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class RPMFormatError(ValueError):
+    pass
+
+
+class _HashingReader:
+    """File wrapper that feeds everything read through it into a SHA-256 digest."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.sha256 = hashlib.sha256()
+        self.offset = 0
+
+    def read(self, size):
+        data = self.fp.read(size)
+        self.sha256.update(data)
+        self.offset += len(data)
+        return data
+
+    def read_exactly(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise RPMFormatError(f"truncated RPM file, expected {size} bytes at {self.offset}")
+        return data
+
+    def drain(self):
+        while self.read(CHUNK_SIZE):
+            pass
+
+
+def _decode_entry(store, data_type, offset, count):
+    if data_type == RPM_STRING_TYPE:
+        return store[offset : store.index(b"\0", offset)].decode("utf-8", "replace")
+    if data_type in (RPM_STRING_ARRAY_TYPE, RPM_I18NSTRING_TYPE):
+        values = []
+        for _ in range(count):
+            end = store.index(b"\0", offset)
+            values.append(store[offset:end].decode("utf-8", "replace"))
+            offset = end + 1
+        # For I18N strings, the first value is the untranslated ("C" locale) one, which is what
+        # rpm -q returns as well.
+        return values[0] if data_type == RPM_I18NSTRING_TYPE else values
+    if data_type == RPM_BIN_TYPE:
+        return store[offset : offset + count].hex()
+    if data_type in INT_FORMATS:
+        values = struct.unpack_from(f">{count}{INT_FORMATS[data_type]}", store, offset)
+        return values[0] if count == 1 else list(values)
+    return None
+
+
+def _read_header(reader, wanted_tags, pad=False):
+    magic, nindex, hsize = HEADER_INTRO.unpack(reader.read_exactly(HEADER_INTRO.size))
+    if magic != HEADER_MAGIC:
+        raise RPMFormatError(f"bad header magic at offset {reader.offset - HEADER_INTRO.size}")
+
+    index = reader.read_exactly(nindex * INDEX_ENTRY.size)
+    store = reader.read_exactly(hsize)
+    if pad and hsize % 8:
+        # The signature header is padded to an 8-byte boundary.
+        reader.read_exactly(8 - hsize % 8)
+
+    tags = {}
+    for tag, data_type, offset, count in INDEX_ENTRY.iter_unpack(index):
+        if tag in wanted_tags:
+            tags[wanted_tags[tag]] = _decode_entry(store, data_type, offset, count)
+    return tags
+
+
+def _read_headers(reader, filename):
+    lead = reader.read_exactly(LEAD_SIZE)
+    if lead[:4] != b"\xed\xab\xee\xdb":
+        raise RPMFormatError(f"{filename} is not an RPM file")
+
+    tags = dict.fromkeys([*SIGNATURE_TAGS.values(), *HEADER_TAGS.values()])
+    tags.update(_read_header(reader, SIGNATURE_TAGS, pad=True))
+    tags.update(_read_header(reader, HEADER_TAGS))
+    tags["payloadoffset"] = reader.offset
+    return tags
+
+
+def read_rpm(filename):
+    """Read an RPM file once and return its SHA-256 checksum together with selected header tags.
+
+    This replaces separate `rpm -qp --qf ...` calls per tag and a second pass over the file to
+    compute its checksum. Tags missing from the headers are returned as None.
+    """
+    with open(filename, "rb") as fp:
+        reader = _HashingReader(fp)
+        tags = _read_headers(reader, filename)
+        reader.drain()
+
+    tags["sha256"] = reader.sha256.hexdigest()
+    return tags
+
+
+def _decompress(fp, compressor):
+    if compressor in (None, "gzip"):
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    if compressor in ("xz", "lzma"):
+        return lzma.LZMAFile(fp)
+    if compressor == "bzip2":
+        return bz2.BZ2File(fp)
+    if compressor == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RPMFormatError("zstd payloads require the zstandard package") from None
+        return zstandard.ZstdDecompressor().stream_reader(fp, read_across_frames=True)
+    raise RPMFormatError(f"unsupported payload compressor: {compressor}")
+
+
+@contextmanager
+def open_payload(filename):
+    """Yield the header tags of an RPM and a file object reading its decompressed cpio payload."""
+    with open(filename, "rb") as fp:
+        tags = _read_headers(_HashingReader(fp), filename)
+        with _decompress(fp, tags["payloadcompressor"]) as payload:
+            yield tags, payload
@@ -0,0 +1,61 @@
+import string
+
+from .graph import DOCUMENT_ID
+
+PREFIX = "SPDXRef-"
+# Underscores become dashes (to retain readability); everything else that isn't allowed in SPDX IDs
+# (letters, numbers, "." and "-") is removed. Non-ASCII characters are dropped before translating.
+_TABLE = bytes.maketrans(b"_", b"-")
+_DELETE = bytes(
+    byte for byte in range(128) if chr(byte) not in string.ascii_letters + string.digits + ".-_"
+)
+
+
+def sanitize_spdxid(value):
+    """Return value made into a valid SPDX ID.
+
+    Different values can give the same ID; use SPDXIDAllocator for IDs that must be unique.
+    """
+    return value.encode("ascii", "ignore").translate(_TABLE, _DELETE).decode("ascii")
+
+
+class SPDXIDAllocator:
+    """Hands out valid SPDX IDs that are unique within one document.
+
+    IDs that are already taken get the suffix "-2", "-3" and so on, in the order they are
+    allocated, so the same sequence of values always gives the same IDs.
+
+    Not thread-safe; parts of a document made concurrently use allocators of their own, which are
+    merged when the parts are.
+    """
+
+    def __init__(self):
+        self.used = {DOCUMENT_ID}
+        self.suffixes = {}
+
+    def allocate(self, value):
+        """Return a new ID for value (e.g. "SPDXRef-<arch>-<name>")."""
+        spdxid = sanitize_spdxid(value)
+        if spdxid in self.used:
+            base = spdxid
+            suffix = self.suffixes.get(base, 1)
+            while spdxid in self.used:
+                suffix += 1
+                spdxid = f"{base}-{suffix}"
+            self.suffixes[base] = suffix
+        elif not spdxid.startswith(PREFIX) or spdxid == PREFIX:
+            raise ValueError(f"no valid SPDX ID can be made of {value!r}")
+        self.used.add(spdxid)
+        return spdxid
+
+    def merge(self, other):
+        """Take over the IDs allocated by other for another part of the same document.
+
+        Raises ValueError if any of them is used already, since IDs handed out can't be changed.
+        """
+        clashes = (self.used & other.used) - {DOCUMENT_ID}
+        if clashes:
+            raise ValueError(f"SPDX IDs used more than once: {', '.join(sorted(clashes))}")
+        self.used |= other.used
+        for base, suffix in other.suffixes.items():
+            self.suffixes[base] = max(self.suffixes.get(base, 1), suffix)
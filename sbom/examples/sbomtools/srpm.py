@@ -0,0 +1,243 @@
+import hashlib
+import os
+import re
+
+from .rpmheader import RPMFormatError, open_payload
+
+CPIO_HEADER_SIZE = 110
+CPIO_MAGICS = (b"070701", b"070702")
+CPIO_TRAILER = "TRAILER!!!"
+CHUNK_SIZE = 1024 * 1024
+
+SPEC_TAG_RE = re.compile(r"^(Source|Patch|URL)(\d*)\s*:\s*(.*?)\s*$", re.I)
+SPEC_DEFINE_RE = re.compile(r"^%(?:define|global)\s+(\w+)(?:\(\))?\s+(.*?)\s*$")
+SPEC_CONDITIONAL_RE = re.compile(r"^%(if\w*|else|elif\w*|endif)\b")
+SPEC_CHANGELOG_RE = re.compile(r"^%changelog\b")
+SPEC_LIST_RE = re.compile(r"^%(sourcelist|patchlist)\b")
+SPEC_MACRO_LINE_RE = re.compile(r"^%(\w*)")
+# Sections whose bodies aren't preamble, so lines in them that look like tags aren't tags
+SPEC_SECTIONS = {
+    "description",
+    "prep",
+    "conf",
+    "generate_buildrequires",
+    "build",
+    "install",
+    "check",
+    "clean",
+    "files",
+    "pre",
+    "post",
+    "preun",
+    "postun",
+    "pretrans",
+    "posttrans",
+    "preuntrans",
+    "postuntrans",
+    "verifyscript",
+    "trigger",
+    "triggerin",
+    "triggerun",
+    "triggerprein",
+    "triggerpostun",
+    "filetrigger",
+    "filetriggerin",
+    "filetriggerun",
+    "filetriggerpostun",
+    "transfiletrigger",
+    "transfiletriggerin",
+    "transfiletriggerun",
+    "transfiletriggerpostun",
+    "sepolicy",
+    "end",
+}
+# Macros that may be used in a preamble and can't add tags
+SPEC_PREAMBLE_MACROS = {"undefine", "bcond", "bcond_with", "bcond_without"}
+MACRO_RE = re.compile(r"%%|%\{(!?\??)(\w+)(?::([^{}]*))?\}|%(\w+)")
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            raise RPMFormatError("truncated cpio payload")
+        data += more
+    return data
+
+
+def _skip(stream, size):
+    while size:
+        size -= len(_read_exactly(stream, min(size, CHUNK_SIZE)))
+
+
+def iter_cpio(stream):
+    """Yield (name, size, chunks) for each entry of a newc cpio archive.
+
+    chunks is an iterator over the entry's data; whatever is not consumed before advancing to the
+    next entry is skipped.
+    """
+    while True:
+        header = _read_exactly(stream, CPIO_HEADER_SIZE)
+        if header[:6] not in CPIO_MAGICS:
+            raise RPMFormatError(f"unsupported cpio header: {header[:6]!r}")
+        size = int(header[54:62], 16)
+        namesize = int(header[94:102], 16)
+        name = _read_exactly(stream, namesize)[:-1].decode("utf-8", "replace")
+        _skip(stream, -(CPIO_HEADER_SIZE + namesize) % 4)
+        if name == CPIO_TRAILER:
+            return
+
+        remaining = [size]
+
+        def chunks(remaining=remaining):
+            while remaining[0]:
+                chunk = _read_exactly(stream, min(remaining[0], CHUNK_SIZE))
+                remaining[0] -= len(chunk)
+                yield chunk
+
+        yield name, size, chunks()
+        _skip(stream, remaining[0] + (-size % 4))
+
+
+def read_srpm(filename):
+    """Read an SRPM's payload in a single streaming pass, without extracting it.
+
+    Returns the header tags, the text of the spec file and a dict of the SHA-256 digests of all
+    other files in the SRPM (its sources and patches), keyed by file name.
+    """
+    spec = None
+    digests = {}
+    with open_payload(filename) as (tags, payload):
+        for name, _, chunks in iter_cpio(payload):
+            name = name.removeprefix("./")
+            if name.endswith(".spec") and spec is None:
+                spec = b"".join(chunks).decode("utf-8", "replace")
+                continue
+            sha256 = hashlib.sha256()
+            for chunk in chunks:
+                sha256.update(chunk)
+            digests[name] = sha256.hexdigest()
+    return tags, spec, digests
+
+
+def expand_macros(value, macros):
+    """Expand the spec macros in value; return None if any of them cannot be expanded here.
+
+    macros maps macro names to their values, or to None if their value is not known.
+    """
+    for _ in range(10):
+        unresolved = False
+
+        def expand(m):
+            nonlocal unresolved
+            if m.group(0) == "%%":
+                return "%%"
+            flags, name, alternative = m.group(1) or "", m.group(2) or m.group(4), m.group(3)
+            if macros.get(name, "") is None:
+                unresolved = True
+                return m.group(0)
+            if "?" in flags:
+                defined = name in macros
+                if "!" in flags:
+                    defined = not defined
+                    return (alternative or "") if defined else ""
+                if alternative is not None:
+                    return alternative if defined else ""
+                return macros.get(name, "")
+            if name in macros:
+                return macros[name]
+            unresolved = True
+            return m.group(0)
+
+        expanded = MACRO_RE.sub(expand, value)
+        if unresolved:
+            return None
+        if expanded == value:
+            if "%" in expanded.replace("%%", ""):
+                # e.g. shell expansion or a lua macro
+                return None
+            return expanded.replace("%%", "%")
+        value = expanded
+    return None
+
+
+def spec_sources(spec, tags):
+    """Return the Source and Patch lines of a spec the way `rpmdev-spectool --all` prints them.
+
+    Only simple specs are handled in-process: if a Source or Patch tag is conditional or uses a
+    macro that can't be expanded without rpm, the spec has a %sourcelist or %patchlist section, or
+    a preamble has a macro line (or section) not known here, None is returned and the caller should
+    fall back to rpmdev-spectool. Tags are only read in the preamble of the spec and those of its
+    %package sections, like rpm does.
+
+    Tags without a number are numbered like rpm does: one more than the highest number of the
+    same kind of tag so far (starting at 0).
+    """
+    macros = {
+        "name": tags["name"],
+        "version": tags["version"],
+        "release": tags["release"],
+        # rpm's defaults
+        "_topdir": os.path.expanduser("~/rpmbuild"),
+        "_builddir": "%{_topdir}/BUILD",
+        "_sourcedir": "%{_topdir}/SOURCES",
+    }
+    if tags["epoch"] is not None:
+        macros["epoch"] = str(tags["epoch"])
+
+    sources = []
+    last_numbers = {"Source": -1, "Patch": -1}
+    depth = 0
+    preamble = True
+    for line in spec.splitlines():
+        line = line.strip()
+        if SPEC_CHANGELOG_RE.match(line):
+            break
+        if SPEC_LIST_RE.match(line):
+            return None
+        if m := SPEC_CONDITIONAL_RE.match(line):
+            keyword = m.group(1)
+            if keyword.startswith("if"):
+                depth += 1
+            elif keyword == "endif":
+                depth -= 1
+            continue
+        if m := SPEC_DEFINE_RE.match(line):
+            # A value depending on a condition we can't evaluate is unknown (None).
+            macros[m.group(1)] = None if depth else m.group(2)
+            continue
+        if m := SPEC_MACRO_LINE_RE.match(line):
+            name = m.group(1)
+            if name == "package":
+                preamble = True
+            elif name in SPEC_SECTIONS:
+                preamble = False
+            elif preamble and name not in SPEC_PREAMBLE_MACROS:
+                # Could expand to tags, or start a section we don't know
+                return None
+            continue
+        if not preamble or not (m := SPEC_TAG_RE.match(line)):
+            continue
+
+        tag, number, value = m.groups()
+        tag = tag.capitalize()
+        if tag == "Url":
+            macros["url"] = None if depth else value
+        if tag not in ("Source", "Patch"):
+            continue
+        if depth:
+            return None
+        expanded = expand_macros(value, macros)
+        if expanded is None:
+            return None
+        number = int(number) if number else last_numbers[tag] + 1
+        last_numbers[tag] = max(last_numbers[tag], number)
+        macros[f"{tag.upper()}{number}"] = expanded
+        sources.append((tag != "Source", number, expanded))
+
+    # Sources first, then patches, each in numerical order like rpmdev-spectool
+    return [
+        f"{'Patch' if is_patch else 'Source'}{number}: {value}"
+        for is_patch, number, value in sorted(sources)
+    ]
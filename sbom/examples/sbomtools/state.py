@@ -0,0 +1,146 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .rpmheader import read_rpm
+from .writer import write_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    tags TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS builds (
+    build TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    outputs TEXT NOT NULL
+);
+"""
+
+
+def fingerprint(*parts):
+    """Return a stable digest of JSON-serializable inputs."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@functools.cache
+def sbomtools_digest():
+    """Return a digest of the sources of the sbomtools package.
+
+    Scripts include it in their fingerprints, since changes to sbomtools change their output too.
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            digest.update(name.encode() + b"\0")
+            with open(os.path.join(directory, name), "rb") as fp:
+                digest.update(fp.read())
+    return digest.hexdigest()
+
+
+def file_identity(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class StateStore:
+    """SQLite-backed record of previous runs, used to skip work whose inputs haven't changed.
+
+    It keeps the header tags and checksums of RPM files (invalidated by size and mtime), the
+    checksums of written SBOMs, and a fingerprint of the inputs of each processed build.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def read_rpms(self, filenames, map_fn=map):
+        """Return read_rpm() results for filenames, only reading files that changed.
+
+        map_fn can be an executor's map method to read the changed files concurrently.
+        """
+        results = {}
+        stale = []
+        with self.lock:
+            for filename in filenames:
+                path = os.path.abspath(filename)
+                row = self.db.execute(
+                    "SELECT size, mtime_ns, tags FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                if row and tuple(row[:2]) == file_identity(path):
+                    results[filename] = json.loads(row[2])
+                else:
+                    stale.append(filename)
+
+        for filename, rpm_info in zip(stale, map_fn(read_rpm, stale)):
+            results[filename] = rpm_info
+            path = os.path.abspath(filename)
+            with self.lock, self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                    (path, *file_identity(path), rpm_info["sha256"], json.dumps(rpm_info)),
+                )
+
+        return [results[filename] for filename in filenames]
+
+    def _recorded_output(self, path):
+        """Return the recorded SHA-256 of an output file if it wasn't touched since, else None."""
+        row = self.db.execute(
+            "SELECT size, mtime_ns, sha256 FROM outputs WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        try:
+            if not row or tuple(row[:2]) != file_identity(path):
+                return None
+        except FileNotFoundError:
+            return None
+        return row[2]
+
+    def write_output(self, path, doc):
+        """Write doc to path (see writer.write_json) unless the file already has that content.
+
+        Returns True if the file was (re)written.
+        """
+        with self.lock:
+            recorded_sha256 = self._recorded_output(path)
+        sha256, written = write_json(path, doc, unchanged_sha256=recorded_sha256)
+        if written:
+            with self.lock, self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+                    (os.path.abspath(path), *file_identity(path), sha256),
+                )
+        return written
+
+    def is_up_to_date(self, build, build_fingerprint):
+        """Check whether build was processed with the same inputs and its outputs are untouched."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT fingerprint, outputs FROM builds WHERE build = ?", (build,)
+            ).fetchone()
+            if not row or row[0] != build_fingerprint:
+                return False
+            return all(self._recorded_output(path) for path in json.loads(row[1]))
+
+    def record_build(self, build, build_fingerprint, outputs):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO builds VALUES (?, ?, ?)",
+                (build, build_fingerprint, json.dumps(outputs)),
+            )
@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+
+def make_key(source_digests, patch_digests, syft_version, catalogers):
+    """Return the cache key for the scan results of a set of prepared sources.
+
+    Sources and patches are given as dicts of file name to SHA-256 digest; everything else in the
+    SRPM (e.g. the spec file with its release and changelog) is deliberately not part of the key so
+    that rebuilds of the same upstream sources can reuse earlier results.
+    """
+    patch_set = hashlib.sha256()
+    for patch_name, patch_digest in sorted(patch_digests.items()):
+        patch_set.update(f"{patch_name}\0{patch_digest}\n".encode())
+
+    key = {
+        "sources": sorted(source_digests.values()),
+        "patches": patch_set.hexdigest(),
+        "syft": syft_version,
+        "catalogers": catalogers,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class SyftCache:
+    """On-disk cache of filtered syft results with size-bounded LRU eviction.
+
+    Each entry is stored as a gzip-compressed JSON file named after its key. Reading an entry
+    updates its modification time, which is used to evict the least recently used entries once the
+    total size of the cache exceeds max_size bytes.
+    """
+
+    SUFFIX = ".json.gz"
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with gzip.open(path, "rt") as fp:
+                value = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError):
+            # Truncated or corrupt (e.g. written by a process that was killed); ValueError covers
+            # invalid JSON and UTF-8. Drop it so the scan is redone and the entry written again.
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another writer in the meantime; we still have the value.
+            pass
+        return value
+
+    def put(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as fp:
+            fp.write(json.dumps(value).encode())
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.SUFFIX):
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Iterator
+
+# Containers up to this depth (the document and its top-level lists such as "packages") are written
+# element by element; anything below is encoded one element at a time.
+STREAM_DEPTH = 2
+BUFFER_SIZE = 1024 * 1024
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+_umask = None
+_umask_lock = threading.Lock()
+
+
+class StreamedObject:
+    """A JSON object whose (key, value) pairs are produced by an iterable while it is written."""
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+
+def iterencode(doc, indent=2):
+    """Yield the JSON encoding of doc in chunks, identical to json.dumps(doc, indent=indent).
+
+    Top-level values may also be iterators (e.g. generators of packages), which are written as
+    JSON arrays without being materialized first. The document itself may be a StreamedObject.
+    """
+    return _iterencode(doc, 0, indent)
+
+
+def _iterencode(value, level, indent):
+    if level >= STREAM_DEPTH or not isinstance(
+        value, (dict, list, tuple, Iterator, StreamedObject)
+    ):
+        encoded = json.dumps(value, indent=indent)
+        if level:
+            encoded = encoded.replace("\n", "\n" + " " * (indent * level))
+        yield encoded
+        return
+
+    inner = "\n" + " " * (indent * (level + 1))
+    if isinstance(value, dict):
+        start, end, items = "{", "}", value.items()
+    elif isinstance(value, StreamedObject):
+        start, end, items = "{", "}", value.pairs
+    else:
+        start, end, items = "[", "]", ((None, item) for item in value)
+
+    empty = True
+    for key, item in items:
+        yield (start if empty else ",") + inner
+        if key is not None:
+            yield json.dumps(key) + ": "
+        yield from _iterencode(item, level + 1, indent)
+        empty = False
+    yield start + end if empty else "\n" + " " * (indent * level) + end
+
+
+def file_mode():
+    """Return the permissions files get when created under the umask of the process.
+
+    Temporary files are created private, so written files are given these. The umask can only be
+    read by setting it, so that is done once, under a lock, when the first file is written.
+    """
+    global _umask
+    with _umask_lock:
+        if _umask is None:
+            _umask = os.umask(0o077)
+            os.umask(_umask)
+    return 0o666 & ~_umask
+
+
+def get_compression(path):
+    """Return the compression implied by the suffix of path, or None."""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(os.fspath(path))[1])
+
+
+def _compressed_stream(raw, compression):
+    if compression == "gzip":
+        # No timestamp in the gzip header, so that identical documents give identical files.
+        return gzip.GzipFile(fileobj=raw, mode="wb", mtime=0)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression requires the zstandard package") from None
+        return zstandard.ZstdCompressor().stream_writer(raw)
+    raise ValueError(f"unknown compression: {compression}")
+
+
+def write_json(path, doc, compression=None, unchanged_sha256=None):
+    """Stream doc as pretty-printed JSON (plus a trailing newline) to path.
+
+    The output is byte-identical to json.dumps(doc, indent=2) + "\\n", but is written in pieces
+    so that no string copy of the whole document is held in memory. It is compressed with gzip or
+    zstd if requested (or implied by a .gz or .zst suffix of path).
+
+    The file is written to a temporary file first and then moved into place. If the SHA-256 of
+    the (uncompressed) content equals unchanged_sha256, path is left untouched.
+
+    Returns the SHA-256 of the content and whether path was written.
+    """
+    compression = compression or get_compression(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb", buffering=BUFFER_SIZE) as raw:
+            stream = _compressed_stream(raw, compression) if compression else raw
+            with io.TextIOWrapper(stream, encoding="utf-8") as fp:
+                for chunk in iterencode(doc):
+                    fp.write(chunk)
+                    sha256.update(chunk.encode())
+                # Add an extra newline at the end since a lot of editors add one when you save a
+                # file, and these files get opened and read in editors a lot.
+                fp.write("\n")
+                sha256.update(b"\n")
+
+        if sha256.hexdigest() == unchanged_sha256 and os.path.exists(path):
+            os.unlink(tmp_path)
+            return sha256.hexdigest(), False
+        os.chmod(tmp_path, file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return sha256.hexdigest(), True
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sbomtools.srpm import spec_sources  # noqa: E402
+
+TAGS = {"name": "foo", "version": "1", "release": "1.el9", "epoch": None}
+
+
+class SpecSourcesTest(unittest.TestCase):
+    def test_tags_in_section_bodies_are_not_tags(self):
+        spec = (
+            "Name: foo\n"
+            "Source0: foo-1.tar.gz\n"
+            "%description\n"
+            "Patch: this text is not a tag\n"
+            "%prep\n"
+            "%autosetup\n"
+        )
+        self.assertEqual(spec_sources(spec, TAGS), ["Source0: foo-1.tar.gz"])
+
+    def test_package_preambles_have_tags(self):
+        spec = (
+            "Source0: foo-1.tar.gz\n"
+            "%package libs\n"
+            "Source1: libs.tar.gz\n"
+            "%description libs\n"
+            "Source2: not a tag\n"
+        )
+        self.assertEqual(
+            spec_sources(spec, TAGS), ["Source0: foo-1.tar.gz", "Source1: libs.tar.gz"]
+        )
+
+    def test_unnumbered_tags_are_numbered_like_rpm(self):
+        spec = "Source: a\nSource: b\nSource5: c\nSource: d\nPatch: p\nPatch3: q\nPatch: r\n"
+        self.assertEqual(
+            spec_sources(spec, TAGS),
+            [
+                "Source0: a",
+                "Source1: b",
+                "Source5: c",
+                "Source6: d",
+                "Patch0: p",
+                "Patch3: q",
+                "Patch4: r",
+            ],
+        )
+
+    def test_unknown_preamble_macros_and_source_lists_fall_back(self):
+        self.assertIsNone(spec_sources("Source0: a\n%{?python_provide}\n", TAGS))
+        self.assertIsNone(spec_sources("Source0: a\n%sourcelist\nb.tar.gz\n", TAGS))
+
+
+if __name__ == "__main__":
+    unittest.main()